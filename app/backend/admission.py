@@ -0,0 +1,176 @@
+"""
+Admission control for solves. When traffic spikes, letting every request
+start a solve means they all fight over the CPU and most of them time out.
+Instead, each process runs at most settings.SOLVER_MAX_CONCURRENT solves at
+once. A few more can wait in line, but only for so long. Past that, requests
+are turned away right away with a "server busy" message, so the user can try
+again rather than staring at a spinner.
+
+When the line is long, solves also get a smaller budget, so it clears
+faster.
+
+A solve that's already running in another process can't be called back. If
+its request goes away, the solve keeps its slot until it's actually done, so
+the limit counts the solves that are really using the CPU.
+
+The limits are per process. Each gunicorn worker has its own solver pool, so
+SOLVER_MAX_CONCURRENT should match SOLVER_POOL_WORKERS.
+"""
+
+import asyncio
+from collections import deque
+import threading
+import time
+from types import TracebackType
+from typing import Any, Deque, NamedTuple, Optional, Tuple, Type
+from django.conf import settings
+
+from . import metrics
+
+
+# Even with a long line, solves keep at least this much of their budget
+_MIN_BUDGET_SCALE = 0.25
+
+
+class ServerBusy(Exception):
+    pass
+
+
+class Ticket(NamedTuple):
+    # Multiply the solve's expansion and time budgets by this
+    budget_scale: float
+    waited_seconds: float
+
+
+_Waiter = Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.n_active = 0
+        # Under WSGI, each request gets its own event loop in its own thread.
+        # So guard the bookkeeping with a plain lock, and wake waiters on
+        # whichever loop they're waiting on
+        self._lock = threading.Lock()
+        self._waiters: Deque[_Waiter] = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def admit(self) -> "_Admission":
+        return _Admission(self)
+
+    async def acquire(self) -> Ticket:
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.n_active < self.max_concurrent:
+                self.n_active += 1
+                self._report()
+                return Ticket(budget_scale=1.0, waited_seconds=0.0)
+            if len(self._waiters) >= self.max_queue:
+                metrics.increment("amulet_solver_rejected_total", reason="queue_full")
+                raise ServerBusy("queue is full")
+            waiter: _Waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+            # Whoever joins a long line gets a small budget
+            scale = self.get_budget_scale(len(self._waiters))
+            self._report()
+        try:
+            await asyncio.wait_for(waiter[1], self.queue_timeout)
+        except BaseException as exc:
+            # Timed out, or cancelled because the client went away. Either
+            # way, get out of line so nobody hands us a slot we won't use
+            with self._lock:
+                is_in_line = waiter in self._waiters
+                if is_in_line:
+                    self._waiters.remove(waiter)
+                    self._report()
+            # If we're not in line anymore, a slot was handed to us just as we
+            # gave up on it. Pass it along
+            if not is_in_line:
+                self.release()
+            if isinstance(exc, asyncio.TimeoutError):
+                metrics.increment("amulet_solver_rejected_total", reason="deadline")
+                raise ServerBusy("timed out waiting for a slot") from None
+            raise
+        return Ticket(budget_scale=scale, waited_seconds=time.perf_counter() - t0)
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # Hand our slot straight to the next in line
+                loop, future = self._waiters.popleft()
+                loop.call_soon_threadsafe(self._wake, future)
+            else:
+                self.n_active -= 1
+            self._report()
+
+    def _wake(self, future: "asyncio.Future[None]") -> None:
+        # If the waiter already gave up, it passes the slot along itself
+        if not future.done():
+            future.set_result(None)
+
+    def get_budget_scale(self, queue_depth: int) -> float:
+        if not self.max_queue:
+            return 1.0
+        return max(_MIN_BUDGET_SCALE, 1 - queue_depth / (self.max_queue + 1))
+
+    def _report(self) -> None:
+        metrics.set_gauge("amulet_solver_active", self.n_active)
+        metrics.set_gauge("amulet_solver_queue_depth", len(self._waiters))
+
+
+class _Admission:
+    def __init__(self, controller: AdmissionController):
+        self._controller = controller
+        self._held_by: Optional["asyncio.Future[Any]"] = None
+
+    def hold_until_done(self, future: "asyncio.Future[Any]") -> None:
+        # For work that carries on even if we stop waiting for it, like a
+        # solve that's already in another process. The slot stays taken until
+        # the work is done, not just until we leave the block
+        self._held_by = future
+
+    async def __aenter__(self) -> Ticket:
+        ticket = await self._controller.acquire()
+        metrics.observe("amulet_solver_queue_seconds", ticket.waited_seconds)
+        return ticket
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        if self._held_by is None or self._held_by.done():
+            self._controller.release()
+        else:
+            self._held_by.add_done_callback(self._release_when_done)
+
+    def _release_when_done(self, future: "asyncio.Future[Any]") -> None:
+        # Whoever started the work is gone, so nobody else will look at how
+        # it ended
+        if not future.cancelled():
+            future.exception()
+        self._controller.release()
+
+
+_LOCK = threading.Lock()
+_CONTROLLER: Optional[AdmissionController] = None
+
+
+def get_controller() -> AdmissionController:
+    global _CONTROLLER
+    with _LOCK:
+        if _CONTROLLER is None:
+            _CONTROLLER = AdmissionController(
+                max_concurrent=settings.SOLVER_MAX_CONCURRENT,
+                max_queue=settings.SOLVER_MAX_QUEUE,
+                queue_timeout=settings.SOLVER_QUEUE_TIMEOUT_SECONDS,
+            )
+        return _CONTROLLER
@@ -1,2 +1,20 @@
-from .game_manager import GameManager
-from .htmx_helper import HtmxHelper
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .game_manager import GameManager
+    from .htmx_helper import HtmxHelper
+
+
+def __getattr__(name: str) -> Any:
+    # Import the solver on first use, not with the package. Things like
+    # compiled_yaml and tracing get imported on their own, and shouldn't have
+    # to load the whole solver
+    if name == "GameManager":
+        from .game_manager import GameManager
+
+        return GameManager
+    if name == "HtmxHelper":
+        from .htmx_helper import HtmxHelper
+
+        return HtmxHelper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
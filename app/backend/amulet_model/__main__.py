@@ -1,24 +1,51 @@
-from pathlib import Path
 import sys
-from typing import List
+from typing import List, Optional
 
+from . import compiled_yaml, simulate
+from .card import compile_card_data
+from .deck import DEFAULT_DECK, load_deck_list
 from .note import Note, NoteType
 from .game_manager import GameManager, ModelOutputDict
 from .game_state import GameSummaryDict, OpenerDict
 
 
-_PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
-
-
 def main():
-    deck_list = load_deck_list()
+    if sys.argv[1:2] == ["simulate"]:
+        simulate.main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["compile-yaml"]:
+        compile_yaml(sys.argv[2:])
+        return
+    deck_list = load_deck_list(get_flag_value("--deck") or DEFAULT_DECK)
     model_input = GameManager.get_model_input_from_deck_list(deck_list)
-    model_output = GameManager.run(model_input)
+    telemetry = "-t" in sys.argv or "--telemetry" in sys.argv
+    trace_path = get_flag_value("--trace")
+    model_output = GameManager.run(
+        model_input, telemetry=telemetry, trace_path=trace_path
+    )
     if "-b" in sys.argv:
         print_brief(model_output)
     else:
         print_pretty_opener(model_input["opener"])
         print_pretty_summary(model_output["summary"])
+    if telemetry:
+        print_telemetry(model_output)
+    if trace_path is not None:
+        print(f"wrote trace to {trace_path}")
+
+
+def compile_yaml(paths: List[str]) -> None:
+    # The card data always gets compiled, and checked along the way
+    print("compiled", compile_card_data())
+    for path in paths:
+        print("compiled", compiled_yaml.compile_yaml(path))
+
+
+def get_flag_value(flag: str) -> Optional[str]:
+    # Flags like `--trace out.json`
+    if flag not in sys.argv[:-1]:
+        return None
+    return sys.argv[sys.argv.index(flag) + 1]
 
 
 def print_brief(mod: ModelOutputDict) -> None:
@@ -28,15 +55,30 @@ def print_brief(mod: ModelOutputDict) -> None:
         print("draw", mod["summary"]["turn"])
 
 
-def load_deck_list() -> List[str]:
-    deck_list = []
-    with open(f"{_PROJECT_DIR}/assets/deck-list.txt") as handle:
-        for line in handle:
-            if line.startswith("#") or not line.strip():
-                continue
-            n, card_name = line.rstrip().split(None, 1)
-            deck_list += [card_name] * int(n)
-    return deck_list
+def print_telemetry(mod: ModelOutputDict) -> None:
+    search = mod["search"]
+    telemetry = mod["telemetry"]
+    print()
+    print(
+        f"search: {search['mode'].lower()}",
+        f"expanded={search['expanded']}",
+        f"peak_frontier={search['peak_frontier']}",
+        f"proven_optimal={search['proven_optimal']}",
+    )
+    for t in telemetry["turns"]:
+        print(
+            f"turn {t['turn']}:",
+            f"expanded={t['expanded']}",
+            f"generated={t['generated']}",
+            f"duplicates={t['duplicates']}",
+            f"peak_frontier={t['peak_frontier']}",
+            f"ms={1000 * t['seconds']:.1f}",
+        )
+    for reason, n in sorted(telemetry["pruned"].items()):
+        print(f"pruned ({reason}): {n}")
+    effects = sorted(telemetry["effects"].items(), key=lambda x: -x[1]["seconds"])
+    for name, e in effects:
+        print(f"{name}: calls={e['calls']} ms={1000 * e['seconds']:.1f}")
 
 
 def print_pretty_opener(opener: OpenerDict) -> None:
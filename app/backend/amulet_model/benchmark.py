@@ -0,0 +1,471 @@
+"""
+Solver benchmarks. Run from app/backend with:
+
+    python -m amulet_model.benchmark suite
+    python -m amulet_model.benchmark beam
+
+Both play through the checked-in corpus of openers in
+assets/benchmark-corpus.yaml. Each entry has a fixed library order, so every
+run sees exactly the same games.
+
+`suite` measures solve and render latency, states per second, and peak memory,
+and compares the results against assets/benchmark-baseline.json. It exits
+nonzero if any kill turn or expansion count changed, or if things got slower
+than the tolerance allows. Use --save-baseline after an intentional change.
+
+`beam` compares beam search against the exact search. An opener counts as
+accurate if beam search finds the same kill turn as the exact search.
+
+`render` times rendering the summaries of the openers that cast Titan on
+turn three, the most common case, without any solving in the timed part.
+
+`make-corpus` rebuilds the corpus from seeded random openers.
+"""
+
+import argparse
+import json
+from pathlib import Path
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, TypedDict
+import yaml
+
+from .deck import load_deck_list
+from .game_manager import GameManager, ModelInputDict, ModelOutputDict
+from .htmx_helper import HtmxHelper
+
+
+_APP_DIR = Path(__file__).resolve().parent.parent.parent
+_CORPUS_PATH = f"{_APP_DIR}/assets/benchmark-corpus.yaml"
+_BASELINE_PATH = f"{_APP_DIR}/assets/benchmark-baseline.json"
+
+# Same expansion budget as the views, so answers are deterministic and match
+# what users see
+_MAX_EXPANSIONS = 10000
+
+_DEFAULT_REPEATS = 3
+_DEFAULT_TOLERANCE = 0.25
+_DEFAULT_BEAM_WIDTHS = [4, 16, 64]
+_DEFAULT_RENDER_REPEATS = 1000
+
+# Corpus categories, by how many states the exact search expands
+_CATEGORIES = ["easy", "typical", "pathological"]
+_MAX_EASY_EXPANSIONS = 150
+_MIN_PATHOLOGICAL_EXPANSIONS = 2000
+
+
+class CorpusEntry(TypedDict):
+    name: str
+    category: str
+    seed: int
+    on_the_play: bool
+    hand: List[str]
+    library: List[str]
+
+
+class EntryResultDict(TypedDict):
+    turn: int
+    expanded: int
+    solve_ms: float
+    render_ms: float
+    peak_kib: float
+
+
+class SummaryDict(TypedDict):
+    states_per_second: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    render_p50_ms: float
+    peak_kib: float
+
+
+class BaselineDict(TypedDict):
+    entries: Dict[str, EntryResultDict]
+    summary: SummaryDict
+
+
+class Sample(NamedTuple):
+    name: str
+    turn: int
+    seconds: float
+    proven_optimal: bool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="solver benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    suite_parser = subparsers.add_parser("suite", help="run the benchmark suite")
+    suite_parser.add_argument("-r", "--repeats", type=int, default=_DEFAULT_REPEATS)
+    suite_parser.add_argument(
+        "--tolerance", type=float, default=_DEFAULT_TOLERANCE, help="allowed slowdown"
+    )
+    suite_parser.add_argument(
+        "--answers-only", action="store_true", help="skip timing comparisons"
+    )
+    suite_parser.add_argument("--save-baseline", action="store_true")
+    beam_parser = subparsers.add_parser("beam", help="compare beam and exact search")
+    beam_parser.add_argument(
+        "-k", "--beam-width", type=int, nargs="+", default=_DEFAULT_BEAM_WIDTHS
+    )
+    render_parser = subparsers.add_parser("render", help="time summary rendering")
+    render_parser.add_argument(
+        "-r", "--repeats", type=int, default=_DEFAULT_RENDER_REPEATS
+    )
+    corpus_parser = subparsers.add_parser("make-corpus", help="rebuild the corpus")
+    corpus_parser.add_argument("-n", "--n-per-group", type=int, default=4)
+    args = parser.parse_args()
+    if args.command == "suite":
+        sys.exit(main_suite(args))
+    elif args.command == "beam":
+        main_beam(args)
+    elif args.command == "render":
+        main_render(args)
+    else:
+        save_corpus(make_corpus(args.n_per_group))
+
+
+def main_suite(args: argparse.Namespace) -> int:
+    corpus = load_corpus()
+    # Answers don't change between runs, so one is enough to check them
+    repeats = 1 if args.answers_only else args.repeats
+    results, solve_ms = run_suite(corpus, repeats=repeats)
+    summary = summarize(corpus, results, solve_ms)
+    print(format_suite_table(corpus, results))
+    print(format_summary(summary))
+    if args.save_baseline:
+        save_baseline({"entries": results, "summary": summary})
+        print(f"saved baseline to {_BASELINE_PATH}")
+        return 0
+    problems = compare_to_baseline(
+        results,
+        summary,
+        load_baseline(),
+        tolerance=None if args.answers_only else args.tolerance,
+    )
+    for problem in problems:
+        print("REGRESSION:", problem)
+    if not problems:
+        print("OK: matches baseline")
+    return 1 if problems else 0
+
+
+def main_beam(args: argparse.Namespace) -> None:
+    corpus = load_corpus()
+    exact = run_beam_comparison(corpus)
+    print(format_beam_header())
+    print(format_beam_row("exact", exact, exact))
+    for k in args.beam_width:
+        samples = run_beam_comparison(corpus, beam_width=k)
+        print(format_beam_row(f"beam {k}", samples, exact))
+
+
+def main_render(args: argparse.Namespace) -> None:
+    outputs = [solve(entry) for entry in load_corpus()]
+    outputs = [mod for mod in outputs if mod["summary"]["turn"] == 3]
+    renderers: Dict[str, Callable[[ModelOutputDict], str]] = {
+        "summary": lambda mod: HtmxHelper._format_summary(mod["summary"]),
+        "play": HtmxHelper.format_play_output,
+        "page": HtmxHelper.format_output,
+    }
+    print(format_render_header(len(outputs)))
+    for label, render in renderers.items():
+        print(format_render_row(label, time_renders(outputs, render, args.repeats)))
+
+
+def time_renders(
+    outputs: List[ModelOutputDict],
+    render: Callable[[ModelOutputDict], str],
+    repeats: int,
+) -> List[float]:
+    # Microseconds per render, for each output
+    us = []
+    for mod in outputs:
+        # The first render may fill caches, so leave it out
+        render(mod)
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            render(mod)
+        us.append(1e6 * (time.perf_counter() - t0) / repeats)
+    return us
+
+
+def format_render_header(n_outputs: int) -> str:
+    cols = [f"n={n_outputs}", "mean us", "p50 us", "max us"]
+    return "".join(c.rjust(10) for c in cols)
+
+
+def format_render_row(label: str, us: List[float]) -> str:
+    cols = [
+        label,
+        f"{statistics.mean(us):.1f}",
+        f"{percentile(us, 50):.1f}",
+        f"{max(us):.1f}",
+    ]
+    return "".join(c.rjust(10) for c in cols)
+
+
+def load_corpus() -> List[CorpusEntry]:
+    with open(_CORPUS_PATH) as handle:
+        return yaml.safe_load(handle)
+
+
+def save_corpus(corpus: List[CorpusEntry]) -> None:
+    with open(_CORPUS_PATH, "w") as handle:
+        yaml.safe_dump(
+            corpus, handle, sort_keys=False, default_flow_style=None, width=1000
+        )
+
+
+def load_baseline() -> BaselineDict:
+    with open(_BASELINE_PATH) as handle:
+        return json.load(handle)
+
+
+def save_baseline(baseline: BaselineDict) -> None:
+    # Timings aren't meaningful past a couple of decimal places
+    for result in baseline["entries"].values():
+        for key in ["solve_ms", "render_ms", "peak_kib"]:
+            result[key] = round(result[key], 2)
+    for key in baseline["summary"]:
+        baseline["summary"][key] = round(baseline["summary"][key], 2)
+    with open(_BASELINE_PATH, "w") as handle:
+        json.dump(baseline, handle, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def get_model_input(entry: CorpusEntry) -> ModelInputDict:
+    return {
+        "opener": {
+            "hand": list(entry["hand"]),
+            "library": list(entry["library"]),
+            "on_the_play": entry["on_the_play"],
+        },
+        "stats": {i: 0 for i in range(1, 6)},
+    }
+
+
+def solve(entry: CorpusEntry, **kwargs) -> ModelOutputDict:
+    # Timeouts would make results depend on load, so rely on the expansion
+    # budget instead. Keep the library in corpus order
+    kwargs.setdefault("max_expansions", _MAX_EXPANSIONS)
+    return GameManager.run(
+        get_model_input(entry), max_wait_seconds=None, shuffle=False, **kwargs
+    )
+
+
+def run_suite(
+    corpus: List[CorpusEntry], repeats: int
+) -> Tuple[Dict[str, EntryResultDict], List[float]]:
+    results: Dict[str, EntryResultDict] = {}
+    all_solve_ms = []
+    for entry in corpus:
+        solve_ms, render_ms = [], []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            mod = solve(entry)
+            t1 = time.perf_counter()
+            HtmxHelper.format_output(mod)
+            t2 = time.perf_counter()
+            solve_ms.append(1000 * (t1 - t0))
+            render_ms.append(1000 * (t2 - t1))
+        all_solve_ms += solve_ms
+        results[entry["name"]] = {
+            "turn": mod["summary"]["turn"],
+            "expanded": mod["search"]["expanded"],
+            "solve_ms": statistics.median(solve_ms),
+            "render_ms": statistics.median(render_ms),
+            "peak_kib": measure_peak_kib(entry),
+        }
+    return results, all_solve_ms
+
+
+def measure_peak_kib(entry: CorpusEntry) -> float:
+    # Tracing allocations slows things down a lot, so do it in its own pass
+    tracemalloc.start()
+    try:
+        solve(entry)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def summarize(
+    corpus: List[CorpusEntry],
+    results: Dict[str, EntryResultDict],
+    solve_ms: List[float],
+) -> SummaryDict:
+    n_expanded = sum(r["expanded"] for r in results.values())
+    total_seconds = sum(r["solve_ms"] for r in results.values()) / 1000
+    return {
+        "states_per_second": n_expanded / total_seconds,
+        "p50_ms": percentile(solve_ms, 50),
+        "p95_ms": percentile(solve_ms, 95),
+        "p99_ms": percentile(solve_ms, 99),
+        "render_p50_ms": percentile([r["render_ms"] for r in results.values()], 50),
+        "peak_kib": max(r["peak_kib"] for r in results.values()),
+    }
+
+
+def compare_to_baseline(
+    results: Dict[str, EntryResultDict],
+    summary: SummaryDict,
+    baseline: BaselineDict,
+    tolerance: Optional[float],
+) -> List[str]:
+    problems = []
+    for name, expected in sorted(baseline["entries"].items()):
+        if name not in results:
+            problems.append(f"{name}: missing from results")
+            continue
+        for key in ["turn", "expanded"]:
+            if results[name][key] != expected[key]:
+                problems.append(
+                    f"{name}: {key} changed from {expected[key]} to {results[name][key]}"
+                )
+    if tolerance is None:
+        return problems
+    # Latency and memory should stay below the baseline, throughput above it
+    for key in ["p50_ms", "p95_ms", "render_p50_ms", "peak_kib"]:
+        if summary[key] > (1 + tolerance) * baseline["summary"][key]:
+            problems.append(
+                f"{key} went from {baseline['summary'][key]:.1f} to {summary[key]:.1f}"
+            )
+    old_rate = baseline["summary"]["states_per_second"]
+    new_rate = summary["states_per_second"]
+    if new_rate < old_rate / (1 + tolerance):
+        problems.append(f"states_per_second went from {old_rate:.0f} to {new_rate:.0f}")
+    return problems
+
+
+def format_suite_table(
+    corpus: List[CorpusEntry], results: Dict[str, EntryResultDict]
+) -> str:
+    cols = ["category", "openers", "kills", "states/s", "p50 ms", "max ms", "KiB"]
+    lines = ["".join(c.rjust(12) for c in cols)]
+    for category in _CATEGORIES:
+        names = [e["name"] for e in corpus if e["category"] == category]
+        rows = [results[name] for name in names]
+        if not rows:
+            continue
+        turns = [r["turn"] for r in rows]
+        kills = ",".join(f"T{t}x{turns.count(t)}" for t in sorted(set(turns)) if t > 0)
+        n_expanded = sum(r["expanded"] for r in rows)
+        solve_ms = [r["solve_ms"] for r in rows]
+        cols = [
+            category,
+            str(len(rows)),
+            kills or "-",
+            f"{1000 * n_expanded / sum(solve_ms):.0f}",
+            f"{percentile(solve_ms, 50):.1f}",
+            f"{max(solve_ms):.1f}",
+            f"{max(r['peak_kib'] for r in rows):.0f}",
+        ]
+        lines.append("".join(c.rjust(12) for c in cols))
+    return "\n".join(lines)
+
+
+def format_summary(summary: SummaryDict) -> str:
+    return " ".join(
+        [
+            f"states/s={summary['states_per_second']:.0f}",
+            f"p50={summary['p50_ms']:.1f}ms",
+            f"p95={summary['p95_ms']:.1f}ms",
+            f"p99={summary['p99_ms']:.1f}ms",
+            f"render_p50={summary['render_p50_ms']:.2f}ms",
+            f"peak={summary['peak_kib']:.0f}KiB",
+        ]
+    )
+
+
+def run_beam_comparison(
+    corpus: List[CorpusEntry], beam_width: Optional[int] = None
+) -> List[Sample]:
+    samples = []
+    for entry in corpus:
+        # Let the exact search run to completion so it's a fair reference
+        t0 = time.perf_counter()
+        mod = solve(entry, max_expansions=None, beam_width=beam_width)
+        seconds = time.perf_counter() - t0
+        samples.append(
+            Sample(
+                name=entry["name"],
+                turn=mod["summary"]["turn"],
+                seconds=seconds,
+                proven_optimal=mod["search"]["proven_optimal"],
+            )
+        )
+    return samples
+
+
+def format_beam_header() -> str:
+    cols = ["mode", "accuracy", "optimal", "mean ms", "p50 ms", "p95 ms", "total s"]
+    return "".join(c.rjust(10) for c in cols)
+
+
+def format_beam_row(label: str, samples: List[Sample], baseline: List[Sample]) -> str:
+    n_accurate = sum(1 for s, b in zip(samples, baseline) if s.turn == b.turn)
+    n_optimal = sum(1 for s in samples if s.proven_optimal)
+    ms = [1000 * s.seconds for s in samples]
+    cols = [
+        label,
+        f"{100 * n_accurate / len(samples):.0f}%",
+        f"{100 * n_optimal / len(samples):.0f}%",
+        f"{statistics.mean(ms):.1f}",
+        f"{percentile(ms, 50):.1f}",
+        f"{percentile(ms, 95):.1f}",
+        f"{sum(ms) / 1000:.2f}",
+    ]
+    return "".join(c.rjust(10) for c in cols)
+
+
+def make_corpus(n_per_group: int, max_seed: int = 10000) -> List[CorpusEntry]:
+    # Sample seeded openers until we have enough of each category, both on
+    # the play and on the draw
+    groups: Dict[Tuple[str, bool], List[CorpusEntry]] = {
+        (category, otp): [] for category in _CATEGORIES for otp in [True, False]
+    }
+    deck_list = load_deck_list()
+    for seed in range(max_seed):
+        random.seed(seed)
+        opener = GameManager.get_model_input_from_deck_list(list(deck_list))["opener"]
+        entry: CorpusEntry = {
+            "name": "",
+            "category": "",
+            "seed": seed,
+            "on_the_play": opener["on_the_play"],
+            "hand": opener["hand"],
+            "library": opener["library"],
+        }
+        category = get_category(solve(entry)["search"]["expanded"])
+        group = groups[category, entry["on_the_play"]]
+        if len(group) >= n_per_group:
+            continue
+        turn_order = "play" if entry["on_the_play"] else "draw"
+        entry["name"] = f"{category}-{turn_order}-{len(group) + 1}"
+        entry["category"] = category
+        group.append(entry)
+        if all(len(g) >= n_per_group for g in groups.values()):
+            break
+    return [entry for group in groups.values() for entry in group]
+
+
+def get_category(n_expanded: int) -> str:
+    if n_expanded <= _MAX_EASY_EXPANSIONS:
+        return "easy"
+    if n_expanded >= _MIN_PATHOLOGICAL_EXPANSIONS:
+        return "pathological"
+    return "typical"
+
+
+def percentile(values: List[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,69 @@
 from pathlib import Path
-from typing import NamedTuple, Optional, Set
-import yaml
+from typing import Dict, List, NamedTuple, Optional, Set
 
+from . import compiled_yaml
 from .mana import Mana
 
 
+_APP_DIR = Path(__file__).resolve().parent.parent.parent
+_CARD_DATA_PATH = f"{_APP_DIR}/assets/card-data.yaml"
 _CARD_DATA = None
 
-
-def _get_card_data(card_name: str):
+# Every field a card can have, and its type
+_CARD_FIELDS = {
+    "type": str,
+    "image_url": str,
+    "casting_cost": str,
+    "activation_cost": str,
+    "taps_for": str,
+    "display": str,
+    "enters_tapped": bool,
+    "never_defer": bool,
+}
+_REQUIRED_CARD_FIELDS = ["type"]
+
+
+def _load_card_data() -> Dict[str, Dict]:
     global _CARD_DATA
     if _CARD_DATA is None:
-        app_dir = Path(__file__).resolve().parent.parent.parent
-        with open(f"{app_dir}/assets/card-data.yaml") as handle:
-            _CARD_DATA = yaml.safe_load(handle)
+        card_data = compiled_yaml.load(_CARD_DATA_PATH)
+        validate_card_data(card_data)
+        _CARD_DATA = card_data
+    return _CARD_DATA
+
+
+def compile_card_data() -> str:
+    return compiled_yaml.compile_yaml(_CARD_DATA_PATH, validate=validate_card_data)
+
+
+def validate_card_data(card_data: Dict[str, Dict]) -> None:
+    # A typo here would otherwise turn up as a strange line of play
+    if not isinstance(card_data, dict):
+        raise ValueError("card data should map card names to fields")
+    for card_name, fields in card_data.items():
+        if not isinstance(fields, dict):
+            raise ValueError(f"{repr(card_name)}: expected fields")
+        for key in _REQUIRED_CARD_FIELDS:
+            if key not in fields:
+                raise ValueError(f"{repr(card_name)}: missing {key}")
+        for key, value in fields.items():
+            if key not in _CARD_FIELDS:
+                raise ValueError(f"{repr(card_name)}: unknown field {key}")
+            if not isinstance(value, _CARD_FIELDS[key]):
+                raise ValueError(f"{repr(card_name)}: bad value for {key}")
+
+
+def _get_card_data(card_name: str):
     try:
-        return _CARD_DATA[card_name]
+        return _load_card_data()[card_name]
     except KeyError:
         raise ValueError(f"unknown card name: {repr(card_name)}")
 
 
+def get_card_names() -> List[str]:
+    return sorted(_load_card_data())
+
+
 class Card(str):
     @property
     def slug(self) -> str:
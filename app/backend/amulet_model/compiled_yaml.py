@@ -0,0 +1,70 @@
+"""
+Fast loading for our YAML files. PyYAML takes tens of milliseconds just to
+import, and parsing in pure Python is slow too, which adds up to a slow
+first request for every new worker. The Docker build compiles each YAML
+file to JSON next to it. Run from app/backend with:
+
+    python -m amulet_model compile-yaml [OTHER.yaml...]
+
+That compiles (and checks) the card data, plus any other files given.
+
+Each compiled file records a hash of the YAML it came from. load() only
+uses the compiled file if the hash matches, so editing the YAML (or never
+compiling it) just means we parse the YAML like before.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Callable, Optional
+
+
+_SUFFIX = ".compiled.json"
+
+
+def load(yaml_path: str) -> Any:
+    with open(yaml_path, "rb") as handle:
+        source = handle.read()
+    digest = hashlib.sha256(source).hexdigest()
+    try:
+        with open(get_compiled_path(yaml_path)) as handle:
+            compiled = json.load(handle)
+        if compiled["sha256"] == digest:
+            return compiled["data"]
+    except (OSError, ValueError, KeyError, TypeError):
+        # Missing or mangled. Either way, the YAML has the answer
+        pass
+    return _parse(source)
+
+
+def compile_yaml(
+    yaml_path: str, validate: Optional[Callable[[Any], None]] = None
+) -> str:
+    with open(yaml_path, "rb") as handle:
+        source = handle.read()
+    data = _parse(source)
+    if validate is not None:
+        validate(data)
+    # JSON has no dates, no integer keys, and so on
+    if json.loads(json.dumps(data)) != data:
+        raise ValueError(f"{yaml_path} doesn't survive a round trip through JSON")
+    compiled = {"sha256": hashlib.sha256(source).hexdigest(), "data": data}
+    path = get_compiled_path(yaml_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as handle:
+        json.dump(compiled, handle, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return path
+
+
+def get_compiled_path(yaml_path: str) -> str:
+    return os.path.splitext(yaml_path)[0] + _SUFFIX
+
+
+def _parse(source: bytes) -> Any:
+    # Only pay for the import if we actually need it
+    import yaml
+
+    # The C loader is much faster, if PyYAML was built with it
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(source, Loader=loader)
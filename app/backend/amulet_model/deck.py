@@ -0,0 +1,110 @@
+"""
+Deck lists, parsed and checked once, then kept in memory.
+
+The default deck is assets/deck-list.txt. Other decks go in assets/decks,
+one file per deck, named like assets/decks/<name>.txt. Each line is a count
+and a card name. Lines starting with # are comments.
+
+Every card has to be in the card data, and the deck has to be 60 cards, so
+a bad edit fails loudly when the deck is loaded rather than partway through
+a solve. Each lookup checks the file's modification time, so edits get
+picked up without a restart.
+"""
+
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from .card import get_card_names
+
+
+DEFAULT_DECK = "default"
+
+_DECK_SIZE = 60
+_APP_DIR = Path(__file__).resolve().parent.parent.parent
+_DECKS_DIR = f"{_APP_DIR}/assets/decks"
+_DECK_NAME_PATTERN = re.compile(r"[a-z0-9_-]+")
+
+
+class Deck(NamedTuple):
+    name: str
+    # Count and card name for each line of the file, in order
+    counts: List[Tuple[int, str]]
+    # One entry per card, ready to copy and shuffle
+    cards: Tuple[str, ...]
+    mtime: float
+
+
+_LOCK = threading.Lock()
+_DECKS: Dict[str, Deck] = {}
+
+
+def get_deck(name: str = DEFAULT_DECK) -> Deck:
+    path = get_deck_path(name)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        raise ValueError(f"unknown deck: {repr(name)}")
+    with _LOCK:
+        deck = _DECKS.get(name)
+        if deck is None or deck.mtime != mtime:
+            with open(path) as handle:
+                counts = parse_deck_list(handle, path)
+            deck = Deck(
+                name=name,
+                counts=counts,
+                cards=tuple(c for n, c in counts for _ in range(n)),
+                mtime=mtime,
+            )
+            _DECKS[name] = deck
+        return deck
+
+
+def load_deck_list(name: str = DEFAULT_DECK) -> List[str]:
+    # A fresh copy, so the caller can shuffle it
+    return list(get_deck(name).cards)
+
+
+def get_deck_names() -> List[str]:
+    names = [DEFAULT_DECK]
+    if os.path.isdir(_DECKS_DIR):
+        for filename in sorted(os.listdir(_DECKS_DIR)):
+            name, extension = os.path.splitext(filename)
+            if extension == ".txt" and _DECK_NAME_PATTERN.fullmatch(name):
+                names.append(name)
+    return names
+
+
+def get_deck_path(name: str) -> str:
+    if name == DEFAULT_DECK:
+        return f"{_APP_DIR}/assets/deck-list.txt"
+    # Names may come from users, so don't let them wander out of the folder
+    if not _DECK_NAME_PATTERN.fullmatch(name):
+        raise ValueError(f"bad deck name: {repr(name)}")
+    return f"{_DECKS_DIR}/{name}.txt"
+
+
+def parse_deck_list(
+    lines: Iterable[str], source: str = "deck list"
+) -> List[Tuple[int, str]]:
+    known_cards = set(get_card_names())
+    counts = []
+    for i, line in enumerate(lines, 1):
+        if line.startswith("#") or not line.strip():
+            continue
+        try:
+            n, card_name = line.rstrip().split(None, 1)
+            count = int(n)
+        except ValueError:
+            raise ValueError(f"{source}:{i}: expected a count and a card name")
+        if count <= 0:
+            raise ValueError(f"{source}:{i}: bad count: {count}")
+        if card_name not in known_cards:
+            raise ValueError(f"{source}:{i}: unknown card name: {repr(card_name)}")
+        counts.append((count, card_name))
+    total = sum(n for n, _ in counts)
+    if total != _DECK_SIZE:
+        raise ValueError(f"{source}: deck must have 60 cards (got {total})")
+    return counts
@@ -5,11 +5,16 @@ stats.
 """
 
 
+import math
 import random
 import time
-from typing import Dict, List, Set, TypedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TypedDict
+from typing_extensions import NotRequired
 
 from .game_state import GameState, GameSummaryDict, OpenerDict
+from .search_budget import SearchBudget, SearchMode
+from .telemetry import SearchTelemetry, TelemetryDict
+from .tracing import SearchTracer
 
 
 class ModelInputDict(TypedDict):
@@ -17,10 +22,31 @@ class ModelInputDict(TypedDict):
     stats: Dict[int, int]
 
 
+class SearchInfoDict(TypedDict):
+    mode: str
+    peak_frontier: int
+    expanded: int
+    last_explored_turn: int
+    library_depth: int
+    complete: bool
+    proven_optimal: bool
+    timed_out: bool
+
+
+class TurnProgressDict(TypedDict):
+    # Sent to GameManager.run's on_turn callback as each turn is searched
+    turn: int
+    expanded: int
+    frontier: int
+    finished: bool
+
+
 class ModelOutputDict(TypedDict):
     opener: OpenerDict
     summary: GameSummaryDict
     stats: Dict[int, int]
+    search: SearchInfoDict
+    telemetry: NotRequired[TelemetryDict]
 
 
 class GameManager:
@@ -41,28 +67,186 @@ class GameManager:
 
     @classmethod
     def run(
-        cls, mid: ModelInputDict, max_turn: int = 3, max_wait_seconds: float = 3
+        cls,
+        mid: ModelInputDict,
+        max_turn: int = 3,
+        max_wait_seconds: Optional[float] = 3,
+        max_frontier_states: Optional[int] = None,
+        max_frontier_bytes: Optional[int] = None,
+        max_expansions: Optional[int] = None,
+        beam_width: Optional[int] = None,
+        telemetry: bool = False,
+        trace_path: Optional[str] = None,
+        shuffle: bool = True,
+        on_turn: Optional[Callable[[TurnProgressDict], None]] = None,
+        samples: int = 1,
     ) -> ModelOutputDict:
+        if samples > 1:
+            return cls.run_many(
+                mid,
+                samples,
+                max_turn=max_turn,
+                max_wait_seconds=max_wait_seconds,
+                max_frontier_states=max_frontier_states,
+                max_frontier_bytes=max_frontier_bytes,
+                max_expansions=max_expansions,
+                beam_width=beam_width,
+                telemetry=telemetry,
+                trace_path=trace_path,
+                on_turn=on_turn,
+            )
         opener = mid["opener"]
         stats = mid["stats"]
-        # Shuffle the every time so we can play through this hand repeatedly
-        random.shuffle(opener["library"])
-        max_time = time.time() + max_wait_seconds
+        # Shuffle the every time so we can play through this hand repeatedly.
+        # Benchmarks skip this to play out a fixed library order
+        if shuffle:
+            random.shuffle(opener["library"])
+        max_time = (
+            math.inf if max_wait_seconds is None else time.time() + max_wait_seconds
+        )
+        budget = SearchBudget(
+            max_states=max_frontier_states,
+            max_bytes=max_frontier_bytes,
+            max_expansions=max_expansions,
+            beam_width=beam_width,
+        )
+        tracer = None if trace_path is None else SearchTracer()
+        search_telemetry = tracer or (SearchTelemetry() if telemetry else None)
+        if search_telemetry is None:
+            state = cls._solve(opener, max_turn, max_time, budget, None, on_turn)
+        else:
+            with search_telemetry:
+                state = cls._solve(
+                    opener, max_turn, max_time, budget, search_telemetry, on_turn
+                )
+        summary = state.get_summary_from_completed_game()
+        stats[cls._get_stats_turn(summary)] += 1
+        mod: ModelOutputDict = {
+            "opener": opener,
+            "summary": summary,
+            "stats": stats,
+            "search": {
+                "mode": budget.mode.value,
+                "peak_frontier": budget.peak_frontier,
+                "expanded": budget.n_expanded,
+                "last_explored_turn": budget.last_explored_turn,
+                "library_depth": budget.library_depth,
+                "complete": budget.is_complete,
+                "proven_optimal": budget.is_proven_optimal,
+                "timed_out": budget.timed_out,
+            },
+        }
+        if telemetry and search_telemetry is not None:
+            mod["telemetry"] = search_telemetry.to_dict()
+        if tracer is not None and trace_path is not None:
+            tracer.write(trace_path)
+        return mod
+
+    @classmethod
+    def run_many(
+        cls,
+        mid: ModelInputDict,
+        samples: int,
+        max_wait_seconds: Optional[float] = 3,
+        **kwargs: Any,
+    ) -> ModelOutputDict:
+        # Play the opener out over several shuffles, and send back the last one
+        # as an example. The time limit is for all of them together. Once it
+        # runs out, we stop, and a shuffle cut off partway through doesn't
+        # count (unless it's the only one)
+        opener = mid["opener"]
+        stats = mid["stats"]
+        max_time = (
+            math.inf if max_wait_seconds is None else time.time() + max_wait_seconds
+        )
+        # A search only ever sees as far into the library as it draws, and the
+        # rest of the library has the same cards either way. So if a search is
+        # proven optimal, its answer holds for any shuffle with the same cards
+        # on top, and that shuffle doesn't need a search of its own
+        solved: Dict[Tuple[str, ...], ModelOutputDict] = {}
+        depths: Set[int] = set()
+        mod: Optional[ModelOutputDict] = None
+        for i in range(samples):
+            random.shuffle(opener["library"])
+            sample = None
+            for depth in depths:
+                sample = solved.get(tuple(opener["library"][:depth]))
+                if sample is not None:
+                    break
+            if sample is None:
+                if mod is not None and time.time() > max_time:
+                    break
+                remaining = None if max_wait_seconds is None else max_time - time.time()
+                sample = cls.run(
+                    {"opener": opener, "stats": {turn: 0 for turn in stats}},
+                    max_wait_seconds=remaining,
+                    shuffle=False,
+                    **kwargs,
+                )
+                if mod is not None and sample["search"]["timed_out"]:
+                    break
+                if sample["search"]["proven_optimal"]:
+                    depth = sample["search"]["library_depth"]
+                    depths.add(depth)
+                    solved[tuple(opener["library"][:depth])] = sample
+            stats[cls._get_stats_turn(sample["summary"])] += 1
+            mod = sample
+        assert mod is not None
+        return {**mod, "opener": opener, "stats": stats}
+
+    @classmethod
+    def _get_stats_turn(cls, summary: GameSummaryDict) -> int:
+        # Track failure to converge as turn 5+
+        return summary["turn"] if summary["turn"] > 0 else 5
+
+    @classmethod
+    def _solve(
+        cls,
+        opener: OpenerDict,
+        max_turn: int,
+        max_time: float,
+        budget: SearchBudget,
+        telemetry: Optional[SearchTelemetry],
+        on_turn: Optional[Callable[[TurnProgressDict], None]] = None,
+    ) -> GameState:
         # Draw our opening hand and pass into turn 1
         states = GameState.get_turn_zero_state_from_opener(opener).get_next_states(
             max_turn
         )
-        for _ in range(max_turn):
-            states = cls._get_next_turn(states, max_turn=max_turn, max_time=max_time)
-        summary = states.pop().get_summary_from_completed_game()
-        # Track failure to converge as turn 5+
-        turn = summary["turn"] if summary["turn"] > 0 else 5
-        stats[turn] += 1
-        return {"opener": opener, "summary": summary, "stats": stats}
+        budget.library_depth = max(
+            (len(s.opening_library) - len(s.library) for s in states), default=0
+        )
+        for turn in range(1, max_turn + 1):
+            states = cls._get_next_turn(
+                states,
+                max_turn=max_turn,
+                max_time=max_time,
+                budget=budget,
+                telemetry=telemetry,
+            )
+            finished = any(s.is_done or s.is_failed for s in states)
+            if on_turn is not None:
+                on_turn(
+                    {
+                        "turn": turn,
+                        "expanded": budget.n_expanded,
+                        "frontier": len(states),
+                        "finished": finished,
+                    }
+                )
+            # Later turns would just hand back the same state
+            if finished:
+                break
+        return states.pop()
 
     @classmethod
     def _get_next_turn(
-        cls, old_states: Set[GameState], max_turn: int, max_time: float
+        cls,
+        old_states: Set[GameState],
+        max_turn: int,
+        max_time: float,
+        budget: SearchBudget,
+        telemetry: Optional[SearchTelemetry],
     ) -> Set[GameState]:
         # If we found a solution, we're done. Just send it back.
         for s in old_states:
@@ -74,16 +258,116 @@ class GameManager:
         for s in old_states:
             if s.is_failed:
                 return {s}
+        budget.calibrate(next(iter(old_states)))
+        # If the frontier outgrows the budget, throw away this turn's progress
+        # and try again with a cheaper search
+        while True:
+            if telemetry is not None:
+                telemetry.start_turn(max(s.turn for s in old_states))
+            new_states = cls._expand_turn(
+                old_states,
+                max_turn=max_turn,
+                max_time=max_time,
+                budget=budget,
+                telemetry=telemetry,
+            )
+            if telemetry is not None:
+                telemetry.end_turn()
+            if new_states is not None:
+                return new_states
+            if budget.degrade() == SearchMode.ABANDONED:
+                return cls._give_up(old_states, "memory budget exceeded", budget)
+
+    @classmethod
+    def _expand_turn(
+        cls,
+        start_states: Set[GameState],
+        max_turn: int,
+        max_time: float,
+        budget: SearchBudget,
+        telemetry: Optional[SearchTelemetry],
+    ) -> Optional[Set[GameState]]:
+        if budget.mode == SearchMode.BEAM:
+            started = 0.0 if telemetry is None else telemetry.now()
+            old_states = cls._keep_best(start_states, budget.beam_width)
+            if len(old_states) < len(start_states):
+                budget.is_lossy = True
+            if telemetry is not None:
+                telemetry.end_phase("beam", started)
+        else:
+            old_states = set(start_states)
         old_turn = max(s.turn for s in old_states)
-        new_states = set()
+        n_library = len(next(iter(old_states)).opening_library)
+        new_states: Set[GameState] = set()
+        # Work through the turn in waves. The order doesn't matter for an
+        # exhaustive search, but if we might run out of work partway through,
+        # sort each wave so that we always stop in the same place
         while old_states:
-            for s in old_states.pop().get_next_states(max_turn):
-                if s.is_done:
-                    return {s}
-                elif time.time() > max_time:
-                    return {s.with_tombstone("timeout")}
-                elif s.turn > old_turn:
-                    new_states.add(s)
-                else:
-                    old_states.add(s)
+            if budget.is_deterministic:
+                started = 0.0 if telemetry is None else telemetry.now()
+                wave = sorted(old_states, key=GameState.get_sort_key)
+                if telemetry is not None:
+                    telemetry.end_phase("sort", started)
+            else:
+                wave = list(old_states)
+            old_states = set()
+            for i, state in enumerate(wave):
+                if budget.is_out_of_work or time.time() > max_time:
+                    if budget.is_out_of_work:
+                        reason = "search budget exhausted"
+                    else:
+                        reason = "timeout"
+                        budget.timed_out = True
+                    candidates = new_states | old_states | set(wave[i:])
+                    return cls._give_up(candidates, reason, budget)
+                budget.n_expanded += 1
+                started = 0.0 if telemetry is None else telemetry.now()
+                next_states = state.get_next_states(max_turn, budget.prune_harder)
+                if budget.is_deterministic:
+                    next_states = sorted(next_states, key=GameState.get_sort_key)
+                if telemetry is not None:
+                    telemetry.count_expansion(len(next_states), started)
+                    started = telemetry.now()
+                n_queued = len(old_states) + len(new_states)
+                for s in next_states:
+                    if n_library - len(s.library) > budget.library_depth:
+                        budget.library_depth = n_library - len(s.library)
+                    if s.is_done:
+                        return {s}
+                    elif s.turn > old_turn:
+                        new_states.add(s)
+                    else:
+                        old_states.add(s)
+                n_pending = len(wave) - i - 1 + len(old_states)
+                if telemetry is not None:
+                    # Anything that didn't grow the frontier was a duplicate
+                    n_added = len(old_states) + len(new_states) - n_queued
+                    n_frontier = n_pending + len(new_states)
+                    telemetry.count_frontier(
+                        len(next_states) - n_added, n_frontier, started
+                    )
+                if budget.is_exceeded(n_pending + len(new_states)):
+                    return None
+        budget.last_explored_turn = old_turn
         return new_states
+
+    @classmethod
+    def _give_up(
+        cls, states: Set[GameState], reason: str, budget: SearchBudget
+    ) -> Set[GameState]:
+        # Rather than an empty tombstone, show the most promising line we had
+        # found so far
+        budget.is_complete = False
+        if budget.last_explored_turn:
+            reason += f", explored through turn {budget.last_explored_turn}"
+        best = cls._keep_best(states, 1).pop()
+        return {best.with_tombstone(reason)}
+
+    @classmethod
+    def _keep_best(cls, states: Set[GameState], n: int) -> Set[GameState]:
+        if len(states) <= n:
+            return set(states)
+        ranked = sorted(
+            states, key=lambda s: (s.get_progress_score(), s.turn, s.get_sort_key())
+        )
+        return set(ranked[-n:])
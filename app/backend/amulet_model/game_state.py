@@ -5,13 +5,16 @@ are handled by creating new objects. By using the GameState.get_next_states, we
 iterate through all possible sequences of plays until we find a winning line.
 """
 
-from typing import List, Set, NamedTuple, Tuple, TypedDict
+from typing import List, Optional, Set, NamedTuple, Tuple, TypedDict
 from typing_extensions import NotRequired, Unpack
 import sys
+import time
 
 from .mana import Mana
 from .card import Card, CardWithMetadata
+from .move_generator import MoveGenerator
 from .note import Note
+from .telemetry import get_active_telemetry
 
 
 # Options are:
@@ -20,6 +23,14 @@ from .note import Note
 # 2: note amulet triggers when playing a land tapped
 _MANA_NOTE_STYLE = 2
 
+# Weights for GameState.get_progress_score, which ranks states for beam search
+_SCORE_PER_MANA = 4
+_SCORE_PER_LAND = 1
+_SCORE_PER_AMULET = 3
+_SCORE_PER_LAND_PLAY = 3
+_SCORE_PER_PAYOFF = 5
+_PAYOFF_CARDS = {"Primeval Titan", "Summoner's Pact"}
+
 
 class OpenerDict(TypedDict):
     hand: List[str]
@@ -82,28 +93,40 @@ class GameState(NamedTuple):
             "turn": self.turn if self.is_done else -1,
         }
 
-    def get_next_states(self, max_turn: int) -> Set["GameState"]:
+    def get_next_states(
+        self, max_turn: int, prune_harder: bool = False
+    ) -> Set["GameState"]:
         try:
             if self.is_failed:
                 return set()
             if self.is_done or self.turn > max_turn:
                 return {self}
             # Passing the turn is always an option
-            states = self.pass_turn(max_turn)
-            for c in set(self.hand):
-                states |= self.maybe_play_land(c)
-                states |= self.maybe_cast_spell(c)
-            for cwm in set(self.battlefield):
-                states |= self.maybe_activate(cwm)
+            states = self.pass_turn(max_turn, prune_harder)
+            # Only consider moves we know are legal, rather than checking every
+            # card in hand and on the battlefield
+            for c in MoveGenerator.get_land_plays(self.hand, self.land_plays_remaining):
+                states |= self.play_land(c)
+            for c in MoveGenerator.get_castable_spells(
+                self.hand, self.battlefield, self.mana_pool
+            ):
+                states |= self.cast_spell(c)
+            for c in MoveGenerator.get_activations(self.battlefield, self.mana_pool):
+                states |= self.activate(c)
             return states
         except Exception as exc:
             if "--debug" in sys.argv:
                 raise
             return {self.with_tombstone(f"crash: {exc}")}
 
-    def pass_turn(self, max_turn: int) -> Set["GameState"]:
-        if self.turn < max_turn and self.should_be_abandoned_when_passing_turn():
-            return set()
+    def pass_turn(self, max_turn: int, prune_harder: bool = False) -> Set["GameState"]:
+        if self.turn < max_turn:
+            reason = self.get_reason_to_abandon_when_passing_turn(prune_harder)
+            if reason is not None:
+                telemetry = get_active_telemetry()
+                if telemetry is not None:
+                    telemetry.count_pruned(reason)
+                return set()
         # Passing the final turn means this state failed to converge. Put a
         # tombstone on it so we can still look
         if self.turn == max_turn:
@@ -131,24 +154,60 @@ class GameState(NamedTuple):
         else:
             return self.draw_a_card()
 
-    def should_be_abandoned_when_passing_turn(self):
+    def should_be_abandoned_when_passing_turn(self, prune_harder: bool = False):
+        return self.get_reason_to_abandon_when_passing_turn(prune_harder) is not None
+
+    def get_reason_to_abandon_when_passing_turn(
+        self, prune_harder: bool = False
+    ) -> Optional[str]:
         # Cast a pact we can't pay for
         mana_pool = self.get_mana_pool_for_new_turn()
         if not mana_pool >= self.mana_debt:
-            return True
+            return "unpayable pact"
         # Cast a Pact on turn 1
         if self.turn == 1 and self.mana_debt:
-            return True
+            return "pact on turn 1"
         # Skipped playing a land when there is no reason to defer. Note: this
         # does not apply to ETB tapped lands because of Amulet.
         mandatory_lands = {c for c in self.hand if c.is_land and c.never_defer}
         if self.land_plays_remaining and mandatory_lands:
-            return True
+            return "skipped land"
         # Skipped casting a spell when there is no reason to defer
         mandatory_spells = {c for c in self.hand if c.is_spell and c.never_defer}
         if any(self.mana_pool >= c.casting_cost for c in mandatory_spells):
+            return "skipped spell"
+        if prune_harder and self.is_wasteful_when_passing_turn():
+            return "wasteful"
+        return None
+
+    def is_wasteful_when_passing_turn(self) -> bool:
+        # Stronger pruning for when the search is running out of memory. These
+        # rules can miss some lines (e.g. holding a tapped land for Amulet) so
+        # they're off by default
+        if self.land_plays_remaining and any(c.is_land for c in self.hand):
             return True
-        return False
+        spells = {c for c in self.hand if c.is_spell}
+        return any(self.mana_pool >= c.casting_cost for c in spells)
+
+    def get_sort_key(self) -> Tuple:
+        # Unlike hashes, this ordering is the same from one process to the
+        # next. Mana is only partially ordered, so swap it for a plain tuple
+        return tuple(
+            tuple(x) if isinstance(x, Mana) else x for x in self.get_comparable_tuple()
+        )
+
+    def get_progress_score(self) -> int:
+        # Rough measure of how far along this state is, used to decide which
+        # states to keep when we can't keep them all
+        n_lands = sum(1 for cwm in self.battlefield if cwm.card.is_land)
+        n_payoffs = sum(1 for c in set(self.hand) if c in _PAYOFF_CARDS)
+        return (
+            _SCORE_PER_MANA * self.get_mana_pool_for_new_turn().total
+            + _SCORE_PER_LAND * n_lands
+            + _SCORE_PER_AMULET * self._battlefield_count("Amulet of Vigor")
+            + _SCORE_PER_LAND_PLAY * (self.get_land_plays_for_new_turn() - 1)
+            + _SCORE_PER_PAYOFF * min(1, n_payoffs)
+        )
 
     def with_tombstone(self, reason: str) -> "GameState":
         return self.copy_with_updates(
@@ -237,6 +296,9 @@ class GameState(NamedTuple):
     def maybe_play_land(self, c: Card) -> Set["GameState"]:
         if c not in self.hand or not self.land_plays_remaining or not c.is_land:
             return set()
+        return self.play_land(c)
+
+    def play_land(self, c: Card) -> Set["GameState"]:
         state = self.add_land_plays(
             -1,
         )
@@ -274,7 +336,7 @@ class GameState(NamedTuple):
                 state = state.add_notes(
                     f", trigger {n_amulets}x ", Card("Amulet of Vigor")
                 )
-        return getattr(state, "effect_for_playing_" + c.slug)()
+        return state.apply_effect("effect_for_playing_" + c.slug)
 
     def put_land_onto_battlefield_untapped(self, c: Card) -> Set["GameState"]:
         state = (
@@ -284,19 +346,22 @@ class GameState(NamedTuple):
             .add_mana(c.taps_for)
             .sack_duplicate_legendary_land_if_any()
         )
-        return getattr(state, "effect_for_playing_" + c.slug)()
+        return state.apply_effect("effect_for_playing_" + c.slug)
 
     def maybe_cast_spell(self, c: Card) -> Set["GameState"]:
         if not (c in self.hand and c.is_spell and c.casting_cost <= self.mana_pool):
             return set()
         if c.is_legendary and self._battlefield_count(c):
             return set()
+        return self.cast_spell(c)
+
+    def cast_spell(self, c: Card) -> Set["GameState"]:
         state = (
             self.move_from_hand_to_battlefield(c)
             .add_notes("\n", "Cast ", c)
             .pay_mana(c.casting_cost)
         )
-        return getattr(state, "effect_for_casting_" + c.slug)()
+        return state.apply_effect("effect_for_casting_" + c.slug)
 
     def maybe_activate(self, cwm: CardWithMetadata) -> Set["GameState"]:
         c = cwm.card
@@ -306,8 +371,20 @@ class GameState(NamedTuple):
             and c.activation_cost <= self.mana_pool
         ):
             return set()
+        return self.activate(c)
+
+    def activate(self, c: Card) -> Set["GameState"]:
         state = self.add_notes("\n", "Activate ", c).pay_mana(c.activation_cost)
-        return getattr(state, "effect_for_activating_" + c.slug)()
+        return state.apply_effect("effect_for_activating_" + c.slug)
+
+    def apply_effect(self, name: str) -> Set["GameState"]:
+        telemetry = get_active_telemetry()
+        if telemetry is None:
+            return getattr(self, name)()
+        t0 = time.perf_counter()
+        states = getattr(self, name)()
+        telemetry.count_effect(name, time.perf_counter() - t0)
+        return states
 
     def move_from_hand_to_battlefield(self, c: Card) -> "GameState":
         return self.remove_from_hand(c).add_to_battlefield(c)
@@ -6,15 +6,27 @@ For more information on HTMX, see htmx.org
 
 import json
 import math
-from typing import ClassVar, Dict, List, Optional, Set
+from typing import ClassVar, Dict, Optional, Set
 
-from .card import Card
+from . import opener_token
+from .card import Card, get_card_names
 from .game_state import GameSummaryDict, OpenerDict
-from .game_manager import ModelInputDict, ModelOutputDict, ModelOutputDict
+from .game_manager import (
+    ModelInputDict,
+    ModelOutputDict,
+    ModelOutputDict,
+    TurnProgressDict,
+)
 from .note import Note, NoteType
 
 _CARD_IMAGE_URLs = None
 
+# Everything Mana.to_string can produce
+_MANA_SYMBOLS = "0123456789G"
+
+# The teaser offers to play the hand out this many times in one go
+_MORE_SAMPLES = 20
+
 
 class Htmx(str):
     @classmethod
@@ -22,19 +34,45 @@ class Htmx(str):
         return Htmx("".join(args))
 
 
+_LINE_BREAK = Htmx("</p><p class='summary-line'>")
+_TURN_BREAK = Htmx("</p></div><div class='summary-turn'><p class='summary-line'>")
+
+
 class HtmxHelper:
 
     _warnings: ClassVar[Set[str]] = set()
 
+    # Markup for each card and mana symbol, built once from the card data
+    # rather than for every summary
+    _card_names: ClassVar[Dict[str, Htmx]] = {}
+    _card_images: ClassVar[Dict[str, Htmx]] = {}
+    _mana_symbols: ClassVar[Dict[str, Htmx]] = {}
+
+    @classmethod
+    def warm_up(cls) -> None:
+        if cls._card_names:
+            return
+        for card_name in get_card_names():
+            cls._card_images[card_name] = cls._build_card_image(card_name)
+            cls._card_names[card_name] = cls._build_card_name(card_name)
+        for c in _MANA_SYMBOLS:
+            cls._mana_symbols[c] = cls._build_mana_symbol(c)
+
     @classmethod
     def format_input(cls, mid: ModelInputDict) -> Htmx:
+        # Playing it out only swaps the summary, so leave a spot for it
+        return cls._format_page(mid, cls._div("", klass="summary-wrap", id="summary"))
+
+    @classmethod
+    def _format_page(cls, mid: ModelInputDict, htmx_summary: Htmx) -> Htmx:
         htmx_teaser = cls._format_teaser(mid)
         htmx_buttons = cls._format_buttons(mid)
         htmx_opener = cls._format_opener(mid["opener"])
-        return Htmx.join(htmx_teaser, htmx_buttons, htmx_opener)
+        return Htmx.join(htmx_teaser, htmx_buttons, htmx_opener, htmx_summary)
 
     @classmethod
     def _format_opener(cls, opener: OpenerDict) -> Htmx:
+        cls.warm_up()
         card_tags = [cls._card_image_with_autocard(c) for c in opener["hand"]]
         htmx_cards = cls._div(
             cls._div("".join(card_tags), klass="opener-cards"), klass="cards-wrap"
@@ -77,53 +115,77 @@ class HtmxHelper:
         )
 
     @classmethod
-    def _format_play_button(cls, mid: ModelInputDict) -> Htmx:
+    def _format_play_button(cls, mid: ModelInputDict, oob: bool = False) -> Htmx:
         return cls._tag(
             "button",
             inner_html="play it out",
             **{
-                "id": "play-button",
+                **cls._get_swap_attributes("play-button", oob),
                 "hx-get": "/api/play",
                 "hx-trigger": "click",
-                "hx-target": "#main",
-                "hx-swap": "innerHTML",
+                "hx-target": "#summary",
+                "hx-swap": "outerHTML",
                 "hx-vals": cls._serialize_payload(mid),
             },
         )
 
     @classmethod
     def parse_payload(cls, payload: Dict[str, str]) -> ModelInputDict:
-        hand = cls._deserialize_list_of_strings(payload["hand"])
-        library = cls._deserialize_list_of_strings(payload["library"])
-        on_the_play = cls._deserialize_bool(payload["on_the_play"])
-        return {
-            "opener": {
-                "hand": hand,
-                "library": library,
-                "on_the_play": on_the_play,
-            },
-            "stats": cls._deserialize_stats(payload["stats"]),
-        }
+        # Only signed tokens. Buttons from before we had tokens spelled out
+        # every card, and anyone could have sent us anything that way
+        return opener_token.decode(payload["token"])
 
     @classmethod
     def format_output(cls, mod: ModelOutputDict) -> Htmx:
         # We redraw everything, so gotta include the opener here
-        htmx_opener = cls.format_input({"opener": mod["opener"], "stats": mod["stats"]})
-        htmx_summary = cls._format_summary(mod["summary"])
-        return Htmx.join(htmx_opener, htmx_summary)
+        mid: ModelInputDict = {"opener": mod["opener"], "stats": mod["stats"]}
+        return cls._format_page(mid, cls._format_summary(mod["summary"]))
+
+    @classmethod
+    def format_play_output(cls, mod: ModelOutputDict) -> Htmx:
+        # The opener is already up, so just swap in the summary. The teaser and
+        # play button carry the stats, so they get swapped out of band
+        mid: ModelInputDict = {"opener": mod["opener"], "stats": mod["stats"]}
+        return Htmx.join(
+            cls._format_summary(mod["summary"]),
+            cls._format_teaser(mid, oob=True),
+            cls._format_play_button(mid, oob=True),
+        )
+
+    @classmethod
+    def format_searching(cls) -> Htmx:
+        # Progress lines get added to the summary as each turn is searched
+        htmx_searching = cls._tag("p", "Searching...", klass="summary-progress")
+        return cls._div(htmx_searching, klass="summary-wrap", id="summary")
+
+    @classmethod
+    def format_progress(cls, progress: TurnProgressDict) -> Htmx:
+        text = f"Searched turn {progress['turn']} ({progress['expanded']} states)"
+        return cls._tag("p", text, klass="summary-progress")
+
+    @classmethod
+    def format_busy(cls, mid: ModelInputDict) -> Htmx:
+        # Keep the opener up so the user can hit play again
+        return cls._format_page(mid, cls.format_busy_summary())
+
+    @classmethod
+    def format_busy_summary(cls) -> Htmx:
+        htmx_alert = cls._tag("p", cls._alert("SERVER BUSY: TRY AGAIN IN A MOMENT"))
+        return cls._div(htmx_alert, klass="summary-wrap", id="summary")
 
     @classmethod
     def _format_summary(cls, summary: GameSummaryDict) -> Htmx:
         # Our notes only identify the beginning of turns and lines. Tidy up the
         # end tag bookkeeping. FYI: even if we skip this step, Chrome still
         # figures it out
+        cls.warm_up()
         htmx_summary_raw = "".join(cls._from_note(n) for n in summary["notes"])
         misplaced_tags = "</p></div>"
         htmx_summary = htmx_summary_raw[len(misplaced_tags) :] + misplaced_tags
-        return cls._div(htmx_summary, klass="summary-wrap")
+        return cls._div(htmx_summary, klass="summary-wrap", id="summary")
 
     @classmethod
-    def _format_teaser(cls, mid: ModelInputDict) -> Htmx:
+    def _format_teaser(cls, mid: ModelInputDict, oob: bool = False) -> Htmx:
         pt = cls.card_name("Primeval Titan")
         if mid["opener"]["on_the_play"]:
             turn_order = cls._span("on the play", klass="turn-order")
@@ -145,59 +207,37 @@ class HtmxHelper:
             r_max = 100.0 * min(1, (n_success + math.sqrt(n_success)) / n_total)
             r_min = 100.0 * max(0, (n_success - math.sqrt(n_success)) / n_total)
             data_line = f"This hand has a {r_min:.0f}% to {r_max:.0f}% chance to do so ({n_success}/{n_total} samples)."
+        htmx_more = cls._format_sample_link(mid)
         return cls._div(
-            cls._tag("p", avg_line + data_line, klass="teaser"),
+            cls._tag("p", avg_line + data_line + " " + htmx_more, klass="teaser"),
             klass="teaser-wrap",
+            **cls._get_swap_attributes("teaser", oob),
         )
 
     @classmethod
-    def _serialize_payload(cls, mid: ModelInputDict) -> str:
-        opener = mid["opener"]
-        hand_serialized = cls._serialize_list_of_strings(opener["hand"])
-        library_serialized = cls._serialize_list_of_strings(opener["library"])
-        otp_serialized = cls._serialize_bool(opener["on_the_play"])
-        stats_serialized = cls._serialize_stats(mid["stats"])
-        return json.dumps(
-            {
-                "hand": hand_serialized,
-                "library": library_serialized,
-                "on_the_play": otp_serialized,
-                "stats": stats_serialized,
-            }
+    def _format_sample_link(cls, mid: ModelInputDict) -> Htmx:
+        # Like the play button, but with a pile of shuffles in one request
+        return cls._span(
+            f"Play it out {_MORE_SAMPLES} more times.",
+            klass="sample-link",
+            **{
+                "hx-get": "/api/play",
+                "hx-trigger": "click",
+                "hx-target": "#summary",
+                "hx-swap": "outerHTML",
+                "hx-vals": cls._serialize_payload(mid, samples=_MORE_SAMPLES),
+            },
         )
 
     @classmethod
-    def _serialize_list_of_strings(cls, x: List[str]) -> str:
-        return ";".join(x).replace("'", "&apos;")
-
-    @classmethod
-    def _deserialize_list_of_strings(cls, x: str) -> List[str]:
-        return x.replace("&apos;", "'").split(";")
-
-    @classmethod
-    def _deserialize_stats(cls, x: str) -> Dict[int, int]:
-        # "2,5,7,6,3" -> {1:2, 2:5, 3:7, 4:6, 5:3}
-        vals = x.split(",")
-        if len(vals) != 5 or not all(v.isdigit() for v in vals):
-            raise ValueError(f"unable to deserialize stats from {repr(x)}")
-        return {i + 1: int(v) for i, v in enumerate(vals)}
-
-    @classmethod
-    def _serialize_stats(cls, x: Dict[int, int]) -> str:
-        return ",".join(str(v) for k, v in sorted(x.items()))
+    def _get_swap_attributes(cls, element_id: str, oob: bool) -> Dict[str, str]:
+        if oob:
+            return {"id": element_id, "hx-swap-oob": "true"}
+        return {"id": element_id}
 
     @classmethod
-    def _deserialize_bool(cls, x: str) -> bool:
-        if x == "true":
-            return True
-        elif x == "false":
-            return False
-        else:
-            raise ValueError(f"unable to get bool from {repr(x)}")
-
-    @classmethod
-    def _serialize_bool(cls, b: bool) -> str:
-        return "true" if b else "false"
+    def _serialize_payload(cls, mid: ModelInputDict, **params: int) -> str:
+        return json.dumps({"token": opener_token.encode(mid), **params})
 
     @classmethod
     def _from_note(cls, n: Note) -> Htmx:
@@ -216,6 +256,12 @@ class HtmxHelper:
 
     @classmethod
     def card_name(cls, card_name: str, display: Optional[str] = None) -> Htmx:
+        if display is None and card_name in cls._card_names:
+            return cls._card_names[card_name]
+        return cls._build_card_name(card_name, display)
+
+    @classmethod
+    def _build_card_name(cls, card_name: str, display: Optional[str] = None) -> Htmx:
         return cls._span(
             cls._quote_safe(display or card_name),
             klass="card-name",
@@ -228,6 +274,12 @@ class HtmxHelper:
 
     @classmethod
     def _card_image_with_autocard(cls, card_name: str) -> Htmx:
+        if card_name in cls._card_images:
+            return cls._card_images[card_name]
+        return cls._build_card_image(card_name)
+
+    @classmethod
+    def _build_card_image(cls, card_name: str) -> Htmx:
         return cls._img(
             klass="card",
             src=cls._card_image_url(card_name),
@@ -254,10 +306,13 @@ class HtmxHelper:
 
     @classmethod
     def _mana(cls, expr: str) -> Htmx:
-        urls = [cls._mana_symbol_url(x) for x in expr]
-        tags = [cls._img(klass="mana-symbol", src=url) for url in urls]
+        tags = [cls._mana_symbols.get(c) or cls._build_mana_symbol(c) for c in expr]
         return Htmx("".join(tags))
 
+    @classmethod
+    def _build_mana_symbol(cls, c: str) -> Htmx:
+        return cls._img(klass="mana-symbol", src=cls._mana_symbol_url(c))
+
     @classmethod
     def _mana_symbol_url(cls, c: str) -> str:
         return f"https://gatherer.wizards.com/Handlers/Image.ashx?size=medium&type=symbol&name={c}"
@@ -268,11 +323,11 @@ class HtmxHelper:
 
     @classmethod
     def _line_break(cls) -> Htmx:
-        return Htmx("</p><p class='summary-line'>")
+        return _LINE_BREAK
 
     @classmethod
     def _turn_break(cls, text: str) -> Htmx:
-        return Htmx("</p></div><div class='summary-turn'><p class='summary-line'>")
+        return _TURN_BREAK
 
     @classmethod
     def _alert(cls, text: str) -> Htmx:
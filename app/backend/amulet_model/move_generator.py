@@ -0,0 +1,129 @@
+"""
+Legal-move generation with bitmasks. Each card in the card data gets one bit,
+so a hand or a battlefield is a single int. For every mana pool (bucketed by
+the most expensive cost we care about) we precompute which spells we could
+afford and which permanents we could activate. Finding the legal moves for a
+state is then a few bitwise ANDs, rather than a property lookup and a mana
+comparison for every card we're holding.
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from .card import Card, CardWithMetadata, get_card_names
+from .mana import Mana
+
+
+class _Tables:
+    def __init__(self):
+        self.cards = [Card(x) for x in get_card_names()]
+        self.bits = {c: 1 << i for i, c in enumerate(self.cards)}
+        self.lands = self._get_mask(lambda c: c.is_land)
+        self.legendary = self._get_mask(lambda c: c.is_legendary)
+        self.costs: Dict[int, Mana] = {}
+        for c in self.cards:
+            if c.is_spell:
+                self.costs[self.bits[c]] = c.casting_cost
+        self.activation_costs: Dict[int, Mana] = {}
+        for c in self.cards:
+            if c.activation_cost:
+                self.activation_costs[self.bits[c]] = c.activation_cost
+        # Past this much mana, more mana doesn't make anything new affordable
+        all_costs = list(self.costs.values()) + list(self.activation_costs.values())
+        self.max_green = max(m.green for m in all_costs)
+        self.max_total = max(m.total for m in all_costs)
+        self.castable: Dict[Tuple[int, int], int] = {}
+        self.activatable: Dict[Tuple[int, int], int] = {}
+        for green in range(self.max_green + 1):
+            for total in range(green, self.max_total + 1):
+                m = Mana(green=green, total=total)
+                self.castable[green, total] = self._get_affordable(self.costs, m)
+                self.activatable[green, total] = self._get_affordable(
+                    self.activation_costs, m
+                )
+
+    def _get_mask(self, predicate) -> int:
+        mask = 0
+        for c in self.cards:
+            if predicate(c):
+                mask |= self.bits[c]
+        return mask
+
+    def _get_affordable(self, costs: Dict[int, Mana], m: Mana) -> int:
+        mask = 0
+        for bit, cost in costs.items():
+            if cost <= m:
+                mask |= bit
+        return mask
+
+    def get_bucket(self, m: Mana) -> Tuple[int, int]:
+        green = min(m.green, self.max_green)
+        return green, max(green, min(m.total, self.max_total))
+
+
+_TABLES: Optional[_Tables] = None
+
+
+def _get_tables() -> _Tables:
+    global _TABLES
+    if _TABLES is None:
+        _TABLES = _Tables()
+    return _TABLES
+
+
+class MoveGenerator:
+    @classmethod
+    def get_land_plays(cls, hand: Tuple[Card, ...], land_plays: int) -> List[Card]:
+        if not land_plays:
+            return []
+        tables = _get_tables()
+        return cls._get_cards(_get_mask(hand) & tables.lands)
+
+    @classmethod
+    def get_castable_spells(
+        cls,
+        hand: Tuple[Card, ...],
+        battlefield: Tuple[CardWithMetadata, ...],
+        mana_pool: Mana,
+    ) -> List[Card]:
+        tables = _get_tables()
+        mask = _get_mask(hand) & tables.castable[tables.get_bucket(mana_pool)]
+        # Can't cast a second copy of a legendary spell
+        mask &= ~(_get_battlefield_mask(battlefield) & tables.legendary)
+        return cls._get_cards(mask)
+
+    @classmethod
+    def get_activations(
+        cls, battlefield: Tuple[CardWithMetadata, ...], mana_pool: Mana
+    ) -> List[Card]:
+        tables = _get_tables()
+        mask = tables.activatable[tables.get_bucket(mana_pool)]
+        return cls._get_cards(_get_battlefield_mask(battlefield) & mask)
+
+    @classmethod
+    def _get_cards(cls, mask: int) -> List[Card]:
+        cards = _get_tables().cards
+        ret = []
+        while mask:
+            low_bit = mask & -mask
+            ret.append(cards[low_bit.bit_length() - 1])
+            mask ^= low_bit
+        return ret
+
+
+@lru_cache(maxsize=4096)
+def _get_mask(cards: Tuple[Card, ...]) -> int:
+    bits = _get_tables().bits
+    mask = 0
+    for c in cards:
+        try:
+            mask |= bits[c]
+        except KeyError:
+            raise ValueError(f"unknown card name: {repr(c)}")
+    return mask
+
+
+@lru_cache(maxsize=4096)
+def _get_battlefield_mask(battlefield: Tuple[CardWithMetadata, ...]) -> int:
+    # Cards with counters on them (sagas) don't count as copies of the card
+    return _get_mask(tuple(cwm.card for cwm in battlefield if not cwm.n_counters))
@@ -0,0 +1,123 @@
+"""
+Compact, signed tokens for passing an opener back and forth with the browser.
+
+The play button used to carry every card in the library by name, about a
+kilobyte per button. A token is the hand as indices into the card registry
+(every card in the card data, sorted by name), the library as how many of
+each card it has, the play/draw flag, and the stats. The library gets
+shuffled before each play anyway, so its order doesn't need to survive.
+
+Tokens are signed with a key derived from the secret and a fingerprint of
+the card registry. A token that was tampered with, or that was made before
+the card data changed, fails the signature check rather than decoding to
+the wrong cards.
+"""
+
+import base64
+import binascii
+import functools
+import hashlib
+import hmac
+import struct
+from typing import Dict, List, Tuple
+
+from .card import get_card_names
+from .game_manager import ModelInputDict
+
+
+_VERSION = 1
+_SIGNATURE_BYTES = 12
+
+# Version, flags, then the kill count for each of turns 1-5
+_HEADER = struct.Struct("!BB5I")
+_INDEX = struct.Struct("!H")
+_COUNT = struct.Struct("!B")
+_ENTRY = struct.Struct("!HB")
+
+_ON_THE_PLAY = 1
+
+_SECRET = b""
+
+
+def set_secret(secret: str) -> None:
+    global _SECRET
+    _SECRET = secret.encode()
+
+
+def encode(mid: ModelInputDict) -> str:
+    names, indices = _get_registry()
+    opener = mid["opener"]
+    stats = [mid["stats"][turn] for turn in range(1, 6)]
+    flags = _ON_THE_PLAY if opener["on_the_play"] else 0
+    body = _HEADER.pack(_VERSION, flags, *stats)
+    body += _COUNT.pack(len(opener["hand"]))
+    for card_name in opener["hand"]:
+        body += _INDEX.pack(_get_index(indices, card_name))
+    composition: Dict[int, int] = {}
+    for card_name in opener["library"]:
+        index = _get_index(indices, card_name)
+        composition[index] = composition.get(index, 0) + 1
+    for index, count in sorted(composition.items()):
+        body += _ENTRY.pack(index, count)
+    token = body + _sign(body)
+    return base64.urlsafe_b64encode(token).rstrip(b"=").decode()
+
+
+def decode(token: str) -> ModelInputDict:
+    try:
+        data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (binascii.Error, ValueError):
+        raise ValueError("opener token is not base64")
+    body, signature = data[:-_SIGNATURE_BYTES], data[-_SIGNATURE_BYTES:]
+    if len(body) < _HEADER.size + _COUNT.size:
+        raise ValueError("opener token is too short")
+    version, flags, *stats = _HEADER.unpack_from(body)
+    if version != _VERSION:
+        raise ValueError(f"unsupported opener token version: {version}")
+    # Check the signature before trusting anything else in there
+    if not hmac.compare_digest(signature, _sign(body)):
+        raise ValueError("opener token signature does not match")
+    names, _ = _get_registry()
+    offset = _HEADER.size
+    (hand_size,) = _COUNT.unpack_from(body, offset)
+    offset += _COUNT.size
+    hand_end = offset + hand_size * _INDEX.size
+    if hand_end > len(body) or (len(body) - hand_end) % _ENTRY.size:
+        raise ValueError("opener token is malformed")
+    hand = [names[i] for (i,) in _INDEX.iter_unpack(body[offset:hand_end])]
+    library: List[str] = []
+    for index, count in _ENTRY.iter_unpack(body[hand_end:]):
+        library += [names[index]] * count
+    return {
+        "opener": {
+            "hand": hand,
+            "library": library,
+            "on_the_play": bool(flags & _ON_THE_PLAY),
+        },
+        "stats": {turn: n for turn, n in enumerate(stats, 1)},
+    }
+
+
+def _get_index(indices: Dict[str, int], card_name: str) -> int:
+    try:
+        return indices[card_name]
+    except KeyError:
+        raise ValueError(f"unknown card name: {repr(card_name)}")
+
+
+def _sign(body: bytes) -> bytes:
+    digest = hmac.new(_get_key(_SECRET), body, hashlib.sha256).digest()
+    return digest[:_SIGNATURE_BYTES]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_key(secret: bytes) -> bytes:
+    names, _ = _get_registry()
+    fingerprint = hashlib.sha256("\n".join(names).encode()).digest()
+    return hmac.new(secret, b"opener-token:" + fingerprint, hashlib.sha256).digest()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_registry() -> Tuple[List[str], Dict[str, int]]:
+    names = get_card_names()
+    return names, {name: i for i, name in enumerate(names)}
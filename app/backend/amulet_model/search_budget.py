@@ -0,0 +1,124 @@
+"""
+A SearchBudget caps how much work a single call to GameManager.run can do.
+
+The frontier cap bounds memory. When the frontier outgrows it, the search
+degrades one step at a time: first it prunes more aggressively, then it
+switches to a beam search, and as a last resort it gives up with a tombstone.
+
+A beam width can also be set up front. That trades a guaranteed optimal
+answer for a much faster approximate one.
+
+The expansion cap bounds CPU time. Unlike a wall-clock timeout it doesn't
+depend on server load, so the same opener and shuffle always get the same
+answer.
+"""
+
+from enum import Enum
+import sys
+from typing import Optional
+
+from .game_state import GameState
+
+
+# In beam mode, each turn starts from at most this fraction of the budget
+_BEAM_FRACTION = 8
+
+# Rough overhead for each entry in a frontier set (hash, pointer, slack)
+_SET_SLOT_BYTES = 32
+
+
+class SearchMode(Enum):
+    EXACT = "EXACT"
+    PRUNED = "PRUNED"
+    BEAM = "BEAM"
+    ABANDONED = "ABANDONED"
+
+
+_DEGRADED_MODES = {
+    SearchMode.EXACT: SearchMode.PRUNED,
+    SearchMode.PRUNED: SearchMode.BEAM,
+    SearchMode.BEAM: SearchMode.ABANDONED,
+    SearchMode.ABANDONED: SearchMode.ABANDONED,
+}
+
+
+class SearchBudget:
+    def __init__(
+        self,
+        max_states: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_expansions: Optional[int] = None,
+        beam_width: Optional[int] = None,
+    ):
+        self.max_states = max_states
+        self.max_bytes = max_bytes
+        self.max_expansions = max_expansions
+        self.mode = SearchMode.EXACT if beam_width is None else SearchMode.BEAM
+        self.prune_harder = False
+        self.peak_frontier = 0
+        self.n_expanded = 0
+        self.last_explored_turn = 0
+        # How many cards deep into the library any state has drawn. Nothing
+        # past that can change the answer
+        self.library_depth = 0
+        self.is_complete = True
+        # Set if we threw away any states that might have led to a solution
+        self.is_lossy = False
+        self.timed_out = False
+        self._beam_width = beam_width
+        self._limit = max_states
+
+    @property
+    def is_deterministic(self) -> bool:
+        return self.max_expansions is not None
+
+    @property
+    def is_out_of_work(self) -> bool:
+        return self.max_expansions is not None and (
+            self.n_expanded >= self.max_expansions
+        )
+
+    @property
+    def beam_width(self) -> int:
+        if self._beam_width is not None:
+            return self._beam_width
+        if self._limit is None:
+            raise ValueError("beam width is undefined for an unlimited budget")
+        return max(1, self._limit // _BEAM_FRACTION)
+
+    @property
+    def is_proven_optimal(self) -> bool:
+        return self.is_complete and not self.is_lossy
+
+    def calibrate(self, state: GameState) -> None:
+        # States get bigger as notes pile up, so re-estimate every turn
+        if self.max_bytes is None:
+            return
+        limit = max(1, self.max_bytes // estimate_state_bytes(state))
+        if self.max_states is not None:
+            limit = min(limit, self.max_states)
+        self._limit = limit
+
+    def is_exceeded(self, n_states: int) -> bool:
+        if n_states > self.peak_frontier:
+            self.peak_frontier = n_states
+        return self._limit is not None and n_states > self._limit
+
+    def degrade(self) -> SearchMode:
+        self.mode = _DEGRADED_MODES[self.mode]
+        if self.mode == SearchMode.PRUNED:
+            self.prune_harder = True
+            self.is_lossy = True
+        elif self.mode == SearchMode.ABANDONED:
+            self.is_complete = False
+        return self.mode
+
+
+def estimate_state_bytes(state: GameState) -> int:
+    # Card names and notes are mostly shared between states, but each state
+    # carries its own copy of every tuple
+    size = sys.getsizeof(state)
+    for field in [state.hand, state.battlefield, state.library, state.notes]:
+        size += sys.getsizeof(field)
+    size += sum(sys.getsizeof(cwm) for cwm in state.battlefield)
+    return size + _SET_SLOT_BYTES
@@ -0,0 +1,258 @@
+"""
+Batch simulation, for deck statistics. Run from app/backend with:
+
+    python -m amulet_model simulate -n 10000 -o results.jsonl
+
+Each sample is a random opener (or a fixed hand with a random library),
+played out with a fixed expansion budget. Samples are seeded by their index,
+so a run gives the same results no matter how many workers it uses, and an
+interrupted run picks up where it left off when pointed at the same output
+file.
+
+Results stream to the output file as JSON lines, one per sample, after a
+header line with the settings. At the end we print how often we cast Titan
+by each turn, with 95% confidence intervals.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, TypedDict
+
+from .deck import DEFAULT_DECK, load_deck_list
+from .game_manager import GameManager, ModelInputDict
+
+
+_DEFAULT_SAMPLES = 1000
+_DEFAULT_MAX_EXPANSIONS = 10000
+_PROGRESS_SECONDS = 1.0
+
+# 95% confidence
+_Z = 1.96
+
+
+class ConfigDict(TypedDict):
+    deck: str
+    seed: int
+    hand: Optional[List[str]]
+    on_the_play: Optional[bool]
+    max_turn: int
+    max_expansions: int
+
+
+class SampleDict(TypedDict):
+    sample: int
+    on_the_play: bool
+    hand: List[str]
+    turn: int
+    expanded: int
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m amulet_model simulate", description="batch simulation"
+    )
+    parser.add_argument("--deck", default=DEFAULT_DECK, help="name of the deck to use")
+    parser.add_argument("-n", "--samples", type=int, default=_DEFAULT_SAMPLES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--hand", help="fixed hand, with cards separated by ;")
+    turn_order = parser.add_mutually_exclusive_group()
+    turn_order.add_argument("--play", action="store_true", help="always on the play")
+    turn_order.add_argument("--draw", action="store_true", help="always on the draw")
+    parser.add_argument("--max-turn", type=int, default=3)
+    parser.add_argument("--max-expansions", type=int, default=_DEFAULT_MAX_EXPANSIONS)
+    parser.add_argument("-o", "--output", help="JSON lines file, resumed if present")
+    args = parser.parse_args(argv)
+    try:
+        deck_list = load_deck_list(args.deck)
+    except ValueError as e:
+        parser.error(str(e))
+    hand = args.hand.split(";") if args.hand else None
+    if hand is not None:
+        try:
+            split_deck(deck_list, hand)
+        except ValueError as e:
+            parser.error(str(e))
+    config: ConfigDict = {
+        "deck": args.deck,
+        "seed": args.seed,
+        "hand": hand,
+        "on_the_play": True if args.play else False if args.draw else None,
+        "max_turn": args.max_turn,
+        "max_expansions": args.max_expansions,
+    }
+    try:
+        samples = simulate(
+            config, deck_list, args.samples, args.workers, args.output, progress=True
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    print(format_summary(samples, args.max_turn))
+
+
+def simulate(
+    config: ConfigDict,
+    deck_list: List[str],
+    n_samples: int,
+    n_workers: int = 1,
+    output_path: Optional[str] = None,
+    progress: bool = False,
+) -> List[SampleDict]:
+    samples = load_samples(output_path, config) if output_path else []
+    done = {s["sample"] for s in samples}
+    todo = [(config, deck_list, i) for i in range(n_samples) if i not in done]
+    handle = None
+    if output_path:
+        is_new = not os.path.exists(output_path) or not os.path.getsize(output_path)
+        handle = open(output_path, "a")
+        if is_new:
+            handle.write(json.dumps({"config": config}) + "\n")
+    started = time.monotonic()
+    last_progress = 0.0
+    try:
+        for n_new, sample in enumerate(run_samples(todo, n_workers), 1):
+            samples.append(sample)
+            if handle is not None:
+                handle.write(json.dumps(sample) + "\n")
+                handle.flush()
+            now = time.monotonic()
+            is_last = n_new == len(todo)
+            if progress and (is_last or now - last_progress > _PROGRESS_SECONDS):
+                last_progress = now
+                rate = n_new / (now - started)
+                eta = (len(todo) - n_new) / rate
+                print(
+                    f"\r{len(samples)}/{n_samples} samples",
+                    f"({rate:.1f}/s, {eta:.0f}s left) ",
+                    end="",
+                    file=sys.stderr,
+                    flush=True,
+                )
+    finally:
+        if handle is not None:
+            handle.close()
+        if progress:
+            print(file=sys.stderr)
+    return sorted(samples, key=lambda s: s["sample"])
+
+
+def run_samples(
+    todo: List[Tuple[ConfigDict, List[str], int]], n_workers: int
+) -> Iterator[SampleDict]:
+    if n_workers <= 1:
+        for args in todo:
+            yield run_sample(args)
+        return
+    with multiprocessing.Pool(n_workers) as pool:
+        yield from pool.imap_unordered(run_sample, todo, chunksize=4)
+
+
+def run_sample(args: Tuple[ConfigDict, List[str], int]) -> SampleDict:
+    config, deck_list, i = args
+    # Seed each sample on its own, so results don't depend on which worker
+    # picked it up
+    random.seed(f"{config['seed']}-{i}")
+    mid = get_model_input(config, deck_list)
+    on_the_play = mid["opener"]["on_the_play"]
+    hand = list(mid["opener"]["hand"])
+    mod = GameManager.run(
+        mid,
+        max_turn=config["max_turn"],
+        max_wait_seconds=None,
+        max_expansions=config["max_expansions"],
+    )
+    return {
+        "sample": i,
+        "on_the_play": on_the_play,
+        "hand": hand,
+        "turn": mod["summary"]["turn"],
+        "expanded": mod["search"]["expanded"],
+    }
+
+
+def get_model_input(config: ConfigDict, deck_list: List[str]) -> ModelInputDict:
+    if config["hand"] is None:
+        mid = GameManager.get_model_input_from_deck_list(list(deck_list))
+    else:
+        hand, library = split_deck(deck_list, config["hand"])
+        mid = {
+            "opener": {
+                "hand": hand,
+                "library": library,
+                "on_the_play": random.choice([True, False]),
+            },
+            "stats": {i: 0 for i in range(1, 6)},
+        }
+    if config["on_the_play"] is not None:
+        mid["opener"]["on_the_play"] = config["on_the_play"]
+    return mid
+
+
+def split_deck(deck_list: List[str], hand: List[str]) -> Tuple[List[str], List[str]]:
+    library = list(deck_list)
+    for card_name in hand:
+        if card_name not in library:
+            raise ValueError(f"not enough copies in the deck list: {repr(card_name)}")
+        library.remove(card_name)
+    return list(hand), library
+
+
+def load_samples(path: str, config: ConfigDict) -> List[SampleDict]:
+    samples: List[SampleDict] = []
+    try:
+        with open(path) as handle:
+            lines = handle.readlines()
+    except FileNotFoundError:
+        return samples
+    # If we got killed partway through a write, drop the partial line. The
+    # next write starts on a fresh one
+    if lines and not lines[-1].endswith("\n"):
+        lines.pop()
+        with open(path, "w") as handle:
+            handle.writelines(lines)
+    if not lines:
+        return samples
+    if json.loads(lines[0]).get("config") != config:
+        raise ValueError(f"{path} was written with different settings")
+    for line in lines[1:]:
+        samples.append(json.loads(line))
+    return samples
+
+
+def format_summary(samples: List[SampleDict], max_turn: int) -> str:
+    groups: Dict[str, List[SampleDict]] = {
+        "play": [s for s in samples if s["on_the_play"]],
+        "draw": [s for s in samples if not s["on_the_play"]],
+        "all": samples,
+    }
+    header = "".join(f"{k} (n={len(v)})".rjust(24) for k, v in groups.items())
+    lines = ["by turn" + header]
+    for turn in range(1, max_turn + 1):
+        cols = [f"T{turn}".ljust(7)]
+        for group in groups.values():
+            k = sum(1 for s in group if 0 < s["turn"] <= turn)
+            cols.append(format_rate(k, len(group)).rjust(24))
+        lines.append("".join(cols))
+    return "\n".join(lines)
+
+
+def format_rate(k: int, n: int) -> str:
+    if n == 0:
+        return "-"
+    low, high = wilson_interval(k, n)
+    return f"{100 * k / n:.1f}% ({100 * low:.1f}-{100 * high:.1f})"
+
+
+def wilson_interval(k: int, n: int, z: float = _Z) -> Tuple[float, float]:
+    # Better behaved than the normal approximation near 0% and 100%
+    p = k / n
+    denominator = 1 + z**2 / n
+    center = (p + z**2 / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
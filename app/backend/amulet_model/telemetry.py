@@ -0,0 +1,107 @@
+"""
+Optional solver telemetry. GameManager.run reports per-turn counters and
+search phases to the SearchTelemetry it's given.
+Deeper in the search, GameState reports pruning and effect-handler timing to
+whichever SearchTelemetry is active on the current thread. When nothing is
+active, those hooks cost one attribute lookup.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, TypedDict
+
+
+_ACTIVE = threading.local()
+
+
+class TurnTelemetryDict(TypedDict):
+    turn: int
+    expanded: int
+    generated: int
+    duplicates: int
+    peak_frontier: int
+    seconds: float
+
+
+class EffectTelemetryDict(TypedDict):
+    calls: int
+    seconds: float
+
+
+class TelemetryDict(TypedDict):
+    turns: List[TurnTelemetryDict]
+    pruned: Dict[str, int]
+    effects: Dict[str, EffectTelemetryDict]
+
+
+def get_active_telemetry() -> Optional["SearchTelemetry"]:
+    return getattr(_ACTIVE, "telemetry", None)
+
+
+class SearchTelemetry:
+    def __init__(self):
+        self.turns: List[TurnTelemetryDict] = []
+        self.pruned: Dict[str, int] = {}
+        self.effects: Dict[str, EffectTelemetryDict] = {}
+        self._turn_start = 0.0
+
+    def __enter__(self) -> "SearchTelemetry":
+        _ACTIVE.telemetry = self
+        return self
+
+    def __exit__(self, *args) -> None:
+        _ACTIVE.telemetry = None
+
+    def start_turn(self, turn: int) -> None:
+        # Turns that get retried with a cheaper search show up more than once
+        self.turns.append(
+            {
+                "turn": turn,
+                "expanded": 0,
+                "generated": 0,
+                "duplicates": 0,
+                "peak_frontier": 0,
+                "seconds": 0.0,
+            }
+        )
+        self._turn_start = time.perf_counter()
+
+    def end_turn(self) -> None:
+        self.turns[-1]["seconds"] = time.perf_counter() - self._turn_start
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def end_phase(self, name: str, started: float) -> None:
+        # Only the tracer cares about individual phases
+        pass
+
+    def count_expansion(self, n_generated: int, started: float) -> None:
+        turn = self.turns[-1]
+        turn["expanded"] += 1
+        turn["generated"] += n_generated
+        self.end_phase("expand", started)
+
+    def count_frontier(
+        self, n_duplicates: int, n_frontier: int, started: float
+    ) -> None:
+        turn = self.turns[-1]
+        turn["duplicates"] += n_duplicates
+        turn["peak_frontier"] = max(turn["peak_frontier"], n_frontier)
+        self.end_phase("merge", started)
+
+    def count_pruned(self, reason: str) -> None:
+        self.pruned[reason] = self.pruned.get(reason, 0) + 1
+
+    def count_effect(self, name: str, seconds: float) -> None:
+        if name not in self.effects:
+            self.effects[name] = {"calls": 0, "seconds": 0.0}
+        self.effects[name]["calls"] += 1
+        self.effects[name]["seconds"] += seconds
+
+    def to_dict(self) -> TelemetryDict:
+        return {
+            "turns": self.turns,
+            "pruned": self.pruned,
+            "effects": self.effects,
+        }
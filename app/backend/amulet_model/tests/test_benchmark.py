@@ -0,0 +1,39 @@
+"""
+To be run with pytest
+"""
+
+from .. import benchmark
+
+
+def test_corpus():
+    corpus = benchmark.load_corpus()
+    names = [entry["name"] for entry in corpus]
+    assert len(names) == len(set(names))
+    for entry in corpus:
+        assert entry["category"] in benchmark._CATEGORIES
+        assert len(entry["hand"]) == 7
+        assert len(entry["hand"]) + len(entry["library"]) == 60
+
+
+def test_baseline_covers_corpus():
+    corpus = benchmark.load_corpus()
+    baseline = benchmark.load_baseline()
+    assert set(baseline["entries"]) == {entry["name"] for entry in corpus}
+
+
+def test_easy_answers_match_baseline():
+    # The whole suite takes a while, but the easy openers are quick
+    baseline = benchmark.load_baseline()
+    for entry in benchmark.load_corpus():
+        if entry["category"] != "easy":
+            continue
+        mod = benchmark.solve(entry)
+        expected = baseline["entries"][entry["name"]]
+        assert mod["summary"]["turn"] == expected["turn"]
+        assert mod["search"]["expanded"] == expected["expanded"]
+
+
+def test_get_category():
+    assert benchmark.get_category(0) == "easy"
+    assert benchmark.get_category(1000) == "typical"
+    assert benchmark.get_category(10000) == "pathological"
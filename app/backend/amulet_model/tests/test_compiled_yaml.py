@@ -0,0 +1,47 @@
+"""
+To be run with pytest
+"""
+
+import json
+import pytest
+
+from .. import compiled_yaml
+from ..card import validate_card_data
+
+
+def test_compiled_and_stale(tmp_path):
+    yaml_path = str(tmp_path / "config.yaml")
+    with open(yaml_path, "w") as handle:
+        handle.write("hostname: example.com\n")
+    # Nothing compiled yet, so read the YAML
+    assert compiled_yaml.load(yaml_path) == {"hostname": "example.com"}
+    compiled_path = compiled_yaml.compile_yaml(yaml_path)
+    # Doctor the compiled file to check that we're really reading it
+    with open(compiled_path) as handle:
+        compiled = json.load(handle)
+    compiled["data"]["hostname"] = "compiled.example.com"
+    with open(compiled_path, "w") as handle:
+        json.dump(compiled, handle)
+    assert compiled_yaml.load(yaml_path) == {"hostname": "compiled.example.com"}
+    # Once the YAML changes, the compiled file is stale
+    with open(yaml_path, "w") as handle:
+        handle.write("hostname: example.org\n")
+    assert compiled_yaml.load(yaml_path) == {"hostname": "example.org"}
+
+
+def test_not_json(tmp_path):
+    yaml_path = str(tmp_path / "config.yaml")
+    with open(yaml_path, "w") as handle:
+        handle.write("1: one\n")
+    with pytest.raises(ValueError):
+        compiled_yaml.compile_yaml(yaml_path)
+
+
+def test_validate_card_data():
+    validate_card_data({"Forest": {"type": "land", "taps_for": "G"}})
+    with pytest.raises(ValueError):
+        validate_card_data({"Forest": {"taps_for": "G"}})
+    with pytest.raises(ValueError):
+        validate_card_data({"Forest": {"type": "land", "tap_for": "G"}})
+    with pytest.raises(ValueError):
+        validate_card_data({"Forest": {"type": "land", "enters_tapped": "no"}})
@@ -0,0 +1,43 @@
+"""
+To be run with pytest
+"""
+
+import os
+import pytest
+
+from .. import deck
+
+
+def test_default_deck():
+    deck_list = deck.load_deck_list()
+    assert len(deck_list) == 60
+    # Callers shuffle what they get, so it has to be a copy
+    deck_list.clear()
+    assert len(deck.load_deck_list()) == 60
+
+
+def test_parse_deck_list():
+    lines = ["# Lands\n", "56 Forest\n", "\n", "4 Primeval Titan\n"]
+    assert deck.parse_deck_list(lines) == [(56, "Forest"), (4, "Primeval Titan")]
+    with pytest.raises(ValueError):
+        deck.parse_deck_list(["59 Forest\n", "1 Not a Card\n"])
+    with pytest.raises(ValueError):
+        deck.parse_deck_list(["56 Forest\n"])
+    with pytest.raises(ValueError):
+        deck.parse_deck_list(["sixty Forest\n"])
+
+
+def test_named_deck(tmp_path, monkeypatch):
+    monkeypatch.setattr(deck, "_DECKS_DIR", str(tmp_path))
+    path = tmp_path / "mono-green.txt"
+    path.write_text("60 Forest\n")
+    assert deck.get_deck_names() == ["default", "mono-green"]
+    assert deck.load_deck_list("mono-green") == ["Forest"] * 60
+    # Edits get picked up without a restart
+    path.write_text("56 Forest\n4 Primeval Titan\n")
+    os.utime(path, (0, 1))
+    assert deck.load_deck_list("mono-green").count("Primeval Titan") == 4
+    with pytest.raises(ValueError):
+        deck.get_deck("../deck-list")
+    with pytest.raises(ValueError):
+        deck.get_deck("missing")
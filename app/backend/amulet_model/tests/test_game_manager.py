@@ -0,0 +1,117 @@
+"""
+To be run with pytest
+"""
+
+import random
+
+from ..game_manager import GameManager, ModelInputDict
+from ..search_budget import SearchMode
+
+
+def get_model_input(hand, library, on_the_play=True) -> ModelInputDict:
+    return {
+        "opener": {
+            "hand": list(hand),
+            "library": list(library),
+            "on_the_play": on_the_play,
+        },
+        "stats": {i: 0 for i in range(1, 6)},
+    }
+
+
+def get_sample_model_input() -> ModelInputDict:
+    hand = [
+        "Forest",
+        "Simic Growth Chamber",
+        "Amulet of Vigor",
+        "Arboreal Grazer",
+        "Explore",
+        "Primeval Titan",
+        "Summoner's Pact",
+    ]
+    library = ["Forest", "Gruul Turf", "Dryad of the Ilysian Grove"] * 10
+    return get_model_input(hand, library)
+
+
+def test_tiny_frontier_budget_gives_up():
+    mid = get_model_input(["Forest"] * 7, ["Forest"] * 53)
+    mod = GameManager.run(mid, max_frontier_states=1)
+    assert mod["search"]["mode"] == SearchMode.ABANDONED.value
+    assert not mod["search"]["complete"]
+    notes = mod["summary"]["notes"]
+    assert notes[-1].text.startswith("FAILED: MEMORY BUDGET EXCEEDED")
+    assert mod["stats"][5] == 1
+
+
+def test_expansion_budget_is_repeatable():
+    mods = []
+    for _ in range(2):
+        random.seed(0)
+        mods.append(GameManager.run(get_sample_model_input(), max_expansions=50))
+    assert mods[0]["search"] == mods[1]["search"]
+    assert mods[0]["summary"]["turn"] == mods[1]["summary"]["turn"]
+    assert mods[0]["search"]["expanded"] == 50
+
+
+def test_expansion_budget_keeps_best_so_far():
+    random.seed(0)
+    mod = GameManager.run(get_sample_model_input(), max_expansions=50)
+    assert not mod["search"]["complete"]
+    notes = mod["summary"]["notes"]
+    assert notes[-1].text.startswith("FAILED: SEARCH BUDGET EXHAUSTED")
+    # We should see the line we were working on, not just an empty tombstone
+    assert any(n.text.startswith("Turn") for n in notes)
+
+
+def test_unlimited_search_is_complete():
+    random.seed(0)
+    mod = GameManager.run(get_sample_model_input(), max_wait_seconds=None)
+    assert mod["search"]["complete"]
+    assert mod["search"]["mode"] == SearchMode.EXACT.value
+    assert mod["summary"]["turn"] in [2, 3]
+
+
+def test_beam_search():
+    random.seed(0)
+    exact = GameManager.run(get_sample_model_input(), max_wait_seconds=None)
+    random.seed(0)
+    beam = GameManager.run(get_sample_model_input(), beam_width=1000)
+    assert beam["search"]["mode"] == SearchMode.BEAM.value
+    # A beam this wide never has to drop anything
+    assert beam["search"]["proven_optimal"]
+    assert beam["summary"]["turn"] == exact["summary"]["turn"]
+
+
+def test_narrow_beam_is_not_proven_optimal():
+    random.seed(0)
+    mod = GameManager.run(get_sample_model_input(), beam_width=1)
+    assert mod["search"]["complete"]
+    assert not mod["search"]["proven_optimal"]
+
+
+def test_library_depth():
+    # On the play, we draw for turns 2 and 3
+    mid = get_model_input(["Forest"] * 7, ["Forest"] * 53)
+    mod = GameManager.run(mid)
+    assert mod["summary"]["turn"] == -1
+    assert mod["search"]["library_depth"] == 2
+
+
+def test_run_many_counts_every_sample():
+    mid = get_sample_model_input()
+    mod = GameManager.run(mid, samples=10, max_wait_seconds=None)
+    assert mod["stats"] is mid["stats"]
+    assert sum(mid["stats"].values()) == 10
+    assert mod["summary"]["turn"] in [2, 3, -1]
+
+
+def test_run_many_matches_single_runs():
+    # Reusing answers for shuffles with the same cards on top shouldn't change
+    # the stats
+    mids = [get_sample_model_input(), get_sample_model_input()]
+    random.seed(0)
+    for _ in range(10):
+        GameManager.run(mids[0], max_wait_seconds=None)
+    random.seed(0)
+    GameManager.run(mids[1], samples=10, max_wait_seconds=None)
+    assert mids[0]["stats"] == mids[1]["stats"]
@@ -129,3 +129,28 @@ def test_activate_expedition_map():
                 new_states.add(ns)
         states = new_states
     assert any(s.is_done for s in states)
+
+
+def test_prune_harder_when_passing_turn():
+    # Holding a tapped land for Amulet is fine, unless we're short on memory
+    state = GameState(
+        hand=(Card("Bojuka Bog"),),
+        land_plays_remaining=1,
+        library=(Card("Forest"),),
+    )
+    assert state.pass_turn(99)
+    assert not state.pass_turn(99, prune_harder=True)
+
+
+def test_progress_score():
+    forest = Card("Forest").with_metadata()
+    amulet = Card("Amulet of Vigor").with_metadata()
+    state = GameState(battlefield=(forest,))
+    assert GameState(battlefield=(forest, forest)).get_progress_score() > (
+        state.get_progress_score()
+    )
+    assert GameState(battlefield=(forest, amulet)).get_progress_score() > (
+        state.get_progress_score()
+    )
+    titan_in_hand = GameState(battlefield=(forest,), hand=(Card("Primeval Titan"),))
+    assert titan_in_hand.get_progress_score() > state.get_progress_score()
@@ -24,3 +24,65 @@ def test_card_name():
         HtmxHelper.card_name("Urza's Saga")
         == f"<span class='card-name' onclick='show_autocard(\"{url}\")'>Urza&apos;s Saga</span>"
     )
+
+
+def test_format_busy():
+    # The opener stays up, so the play button still carries the payload
+    mid = {
+        "opener": {
+            "hand": ["Forest"] * 7,
+            "library": ["Forest"] * 53,
+            "on_the_play": True,
+        },
+        "stats": {i: 0 for i in range(1, 6)},
+    }
+    htmx = HtmxHelper.format_busy(mid)
+    assert HtmxHelper._serialize_payload(mid).replace("'", "\\'") in htmx
+    assert "SERVER BUSY" in htmx
+
+
+def test_format_play_output():
+    # The teaser and play button get swapped in out of band, with the new stats
+    mod = {
+        "opener": {
+            "hand": ["Forest"] * 7,
+            "library": ["Forest"] * 53,
+            "on_the_play": True,
+        },
+        "summary": {"notes": [], "turn": 0},
+        "stats": {1: 0, 2: 0, 3: 0, 4: 0, 5: 1},
+        "search": {},
+    }
+    htmx = HtmxHelper.format_play_output(mod)
+    assert htmx.startswith("<div class='summary-wrap' id='summary'>")
+    assert "id='teaser' hx-swap-oob='true'" in htmx
+    assert "id='play-button' hx-swap-oob='true'" in htmx
+    # No need to send the opener again
+    assert "opener-cards" not in htmx
+    assert HtmxHelper._serialize_payload(mod).replace("'", "\\'") in htmx
+
+
+def test_cached_fragments():
+    # Cached markup has to match what we'd build from scratch
+    HtmxHelper.warm_up()
+    for card_name in ["Primeval Titan", "Urza's Saga"]:
+        assert HtmxHelper.card_name(card_name) == HtmxHelper._build_card_name(card_name)
+        assert HtmxHelper._card_image_with_autocard(
+            card_name
+        ) == HtmxHelper._build_card_image(card_name)
+    assert HtmxHelper.card_name("Urza's Saga", "Saga").endswith(">Saga</span>")
+    assert HtmxHelper._mana("2G").count("<img") == 2
+
+
+def test_teaser_offers_more_samples():
+    mid = {
+        "opener": {
+            "hand": ["Forest"] * 7,
+            "library": ["Forest"] * 53,
+            "on_the_play": True,
+        },
+        "stats": {i: 0 for i in range(1, 6)},
+    }
+    htmx = HtmxHelper._format_teaser(mid)
+    assert "class='sample-link'" in htmx
+    assert '"samples": 20' in htmx
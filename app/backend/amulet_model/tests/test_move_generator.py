@@ -0,0 +1,50 @@
+"""
+To be run with pytest
+"""
+
+import pytest
+
+from ..card import Card
+from ..mana import Mana
+from ..move_generator import MoveGenerator
+
+
+def test_land_plays():
+    hand = (Card("Forest"), Card("Forest"), Card("Explore"), Card("Bojuka Bog"))
+    assert sorted(MoveGenerator.get_land_plays(hand, 1)) == ["Bojuka Bog", "Forest"]
+    assert MoveGenerator.get_land_plays(hand, 0) == []
+
+
+def test_castable_spells():
+    hand = (Card("Primeval Titan"), Card("Explore"), Card("Amulet of Vigor"))
+    spells = MoveGenerator.get_castable_spells(hand, (), Mana.from_string("1"))
+    assert spells == ["Amulet of Vigor"]
+    spells = MoveGenerator.get_castable_spells(hand, (), Mana.from_string("1G"))
+    assert sorted(spells) == ["Amulet of Vigor", "Explore"]
+    # Mana beyond the most expensive card still works
+    spells = MoveGenerator.get_castable_spells(hand, (), Mana.from_string("20GGGGG"))
+    assert len(spells) == 3
+
+
+def test_no_duplicate_legendary():
+    azusa = Card("Azusa, Lost but Seeking")
+    mana_pool = Mana.from_string("2G")
+    assert MoveGenerator.get_castable_spells((azusa,), (), mana_pool) == [azusa]
+    battlefield = (azusa.with_metadata(),)
+    assert MoveGenerator.get_castable_spells((azusa,), battlefield, mana_pool) == []
+
+
+def test_activations():
+    battlefield = (
+        Card("Expedition Map").with_metadata(),
+        Card("Forest").with_metadata(),
+    )
+    assert MoveGenerator.get_activations(battlefield, Mana.from_string("1")) == []
+    assert MoveGenerator.get_activations(battlefield, Mana.from_string("2")) == [
+        "Expedition Map"
+    ]
+
+
+def test_unknown_card():
+    with pytest.raises(ValueError):
+        MoveGenerator.get_land_plays((Card("fizz buzz"),), 1)
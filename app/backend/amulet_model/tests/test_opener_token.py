@@ -0,0 +1,74 @@
+"""
+To be run with pytest
+"""
+
+import base64
+import json
+import pytest
+
+from .. import opener_token
+from ..deck import load_deck_list
+from ..game_manager import GameManager
+from ..htmx_helper import HtmxHelper
+
+
+def get_model_input():
+    mid = GameManager.get_model_input_from_deck_list(load_deck_list())
+    mid["stats"] = {1: 0, 2: 3, 3: 70000, 4: 1, 5: 9}
+    return mid
+
+
+def test_round_trip():
+    mid = get_model_input()
+    token = opener_token.encode(mid)
+    assert len(token) < 200
+    decoded = opener_token.decode(token)
+    assert decoded["opener"]["hand"] == mid["opener"]["hand"]
+    # The library gets shuffled before each play, so only its contents matter
+    assert sorted(decoded["opener"]["library"]) == sorted(mid["opener"]["library"])
+    assert decoded["opener"]["on_the_play"] == mid["opener"]["on_the_play"]
+    assert decoded["stats"] == mid["stats"]
+
+
+def test_tampered():
+    token = opener_token.encode(get_model_input())
+    data = bytearray(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    # Flip the play/draw flag
+    data[1] ^= 1
+    tampered = base64.urlsafe_b64encode(bytes(data)).rstrip(b"=").decode()
+    with pytest.raises(ValueError):
+        opener_token.decode(tampered)
+
+
+def test_malformed():
+    for token in ["", "!!!", "AAAA", opener_token.encode(get_model_input())[:-4]]:
+        with pytest.raises(ValueError):
+            opener_token.decode(token)
+
+
+def test_wrong_secret():
+    token = opener_token.encode(get_model_input())
+    opener_token.set_secret("something else")
+    try:
+        with pytest.raises(ValueError):
+            opener_token.decode(token)
+    finally:
+        opener_token.set_secret("")
+
+
+def test_parse_payload():
+    mid = get_model_input()
+    payload = json.loads(HtmxHelper._serialize_payload(mid))
+    assert HtmxHelper.parse_payload(payload)["opener"]["hand"] == mid["opener"]["hand"]
+
+
+def test_reject_unsigned_payload():
+    # The old way of spelling out every card isn't signed, so it's refused
+    payload = {
+        "hand": "Forest;Forest",
+        "library": "Forest",
+        "on_the_play": "true",
+        "stats": "0,0,0,0,0",
+    }
+    with pytest.raises(KeyError):
+        HtmxHelper.parse_payload(payload)
@@ -0,0 +1,45 @@
+"""
+To be run with pytest
+"""
+
+from ..card import Card
+from ..game_state import GameState
+from ..search_budget import SearchBudget, SearchMode, estimate_state_bytes
+
+
+def test_degrade():
+    budget = SearchBudget(max_states=100)
+    assert budget.mode == SearchMode.EXACT
+    assert not budget.prune_harder
+    assert budget.degrade() == SearchMode.PRUNED
+    assert budget.prune_harder
+    assert budget.degrade() == SearchMode.BEAM
+    assert budget.degrade() == SearchMode.ABANDONED
+    assert budget.degrade() == SearchMode.ABANDONED
+
+
+def test_peak_frontier():
+    budget = SearchBudget(max_states=10)
+    assert not budget.is_exceeded(5)
+    assert budget.is_exceeded(11)
+    assert not budget.is_exceeded(3)
+    assert budget.peak_frontier == 11
+
+
+def test_unlimited():
+    budget = SearchBudget()
+    budget.calibrate(GameState())
+    assert not budget.is_exceeded(10**9)
+
+
+def test_calibrate_bytes():
+    state = GameState(library=tuple(Card("Forest") for _ in range(50)))
+    n_bytes = estimate_state_bytes(state)
+    budget = SearchBudget(max_bytes=10 * n_bytes)
+    budget.calibrate(state)
+    assert not budget.is_exceeded(10)
+    assert budget.is_exceeded(11)
+    # The tighter of the two limits wins
+    budget = SearchBudget(max_states=5, max_bytes=10 * n_bytes)
+    budget.calibrate(state)
+    assert budget.is_exceeded(6)
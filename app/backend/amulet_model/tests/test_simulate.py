@@ -0,0 +1,68 @@
+"""
+To be run with pytest
+"""
+
+import json
+import pytest
+
+from .. import simulate
+from ..deck import load_deck_list
+
+
+def get_config(**kwargs) -> simulate.ConfigDict:
+    config: simulate.ConfigDict = {
+        "deck": "default",
+        "seed": 0,
+        "hand": None,
+        "on_the_play": None,
+        "max_turn": 3,
+        "max_expansions": 200,
+    }
+    config.update(kwargs)
+    return config
+
+
+def test_resume(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    deck_list = load_deck_list()
+    simulate.simulate(get_config(), deck_list, 3, output_path=path)
+    samples = simulate.simulate(get_config(), deck_list, 5, output_path=path)
+    assert [s["sample"] for s in samples] == [0, 1, 2, 3, 4]
+    with open(path) as handle:
+        lines = handle.readlines()
+    assert json.loads(lines[0]) == {"config": get_config()}
+    assert len(lines) == 6
+    # Picking up where we left off gives the same samples as a fresh run
+    assert samples == simulate.simulate(get_config(), deck_list, 5)
+
+
+def test_resume_with_different_settings(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    deck_list = load_deck_list()
+    simulate.simulate(get_config(), deck_list, 1, output_path=path)
+    with pytest.raises(ValueError):
+        simulate.simulate(get_config(seed=1), deck_list, 1, output_path=path)
+
+
+def test_fixed_hand():
+    hand = ["Forest", "Forest", "Amulet of Vigor"]
+    config = get_config(hand=hand, on_the_play=False)
+    for sample in simulate.simulate(config, load_deck_list(), 2):
+        assert sample["hand"] == hand
+        assert not sample["on_the_play"]
+
+
+def test_split_deck():
+    deck_list = load_deck_list()
+    hand, library = simulate.split_deck(deck_list, ["Forest", "Forest"])
+    assert len(library) == len(deck_list) - 2
+    with pytest.raises(ValueError):
+        simulate.split_deck(deck_list, ["Forest"] * 100)
+
+
+def test_wilson_interval():
+    low, high = simulate.wilson_interval(50, 100)
+    assert round(low, 3) == 0.404
+    assert round(high, 3) == 0.596
+    assert simulate.wilson_interval(0, 10)[0] == 0
+    assert simulate.wilson_interval(10, 10)[1] == 1
@@ -0,0 +1,42 @@
+"""
+To be run with pytest
+"""
+
+import random
+
+from ..card import Card
+from ..game_manager import GameManager
+from ..game_state import GameState
+from ..telemetry import SearchTelemetry, get_active_telemetry
+from .test_game_manager import get_sample_model_input
+
+
+def test_off_by_default():
+    random.seed(0)
+    mod = GameManager.run(get_sample_model_input())
+    assert "telemetry" not in mod
+
+
+def test_run_with_telemetry():
+    random.seed(0)
+    mod = GameManager.run(get_sample_model_input(), telemetry=True)
+    telemetry = mod["telemetry"]
+    turns = [t["turn"] for t in telemetry["turns"]]
+    assert turns == [1, 2, 3][: len(turns)]
+    n_expanded = sum(t["expanded"] for t in telemetry["turns"])
+    assert n_expanded == mod["search"]["expanded"]
+    assert all(t["generated"] >= t["duplicates"] for t in telemetry["turns"])
+    assert telemetry["effects"]
+    # Nothing should leak out to the next search
+    assert get_active_telemetry() is None
+
+
+def test_count_pruned():
+    state = GameState(
+        hand=(Card("Forest"),),
+        land_plays_remaining=1,
+        library=(Card("Forest"),),
+    )
+    with SearchTelemetry() as telemetry:
+        assert not state.pass_turn(99)
+    assert telemetry.pruned == {"skipped land": 1}
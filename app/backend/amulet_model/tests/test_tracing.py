@@ -0,0 +1,38 @@
+"""
+To be run with pytest
+"""
+
+import json
+import random
+
+from .. import tracing
+from ..game_manager import GameManager
+from .test_game_manager import get_sample_model_input
+
+
+def test_write_trace(tmp_path):
+    path = tmp_path / "trace.json"
+    random.seed(0)
+    mod = GameManager.run(get_sample_model_input(), trace_path=str(path))
+    # Tracing doesn't imply telemetry in the output
+    assert "telemetry" not in mod
+    with open(path) as handle:
+        trace = json.load(handle)
+    events = trace["traceEvents"]
+    turns = [e["name"] for e in events if e.get("cat") == "turn"]
+    assert turns[0] == "turn 1"
+    assert any(e.get("cat") == "effect" for e in events)
+    assert any(e["name"] == "merge" for e in events)
+    assert any(e["ph"] == "C" and e["name"] == "frontier" for e in events)
+    assert all(e["dur"] >= 0 for e in events if e["ph"] == "X")
+
+
+def test_drop_events_past_limit(monkeypatch):
+    monkeypatch.setattr(tracing, "_MAX_EVENTS", 2)
+    tracer = tracing.SearchTracer()
+    for _ in range(3):
+        tracer.end_phase("expand", tracer.now())
+    # Two events, then a marker where the rest got dropped
+    assert len(tracer.events) == 3
+    assert tracer.events[-1]["name"] == "trace truncated"
+    assert tracer.to_trace()["otherData"]["dropped_events"] == 1
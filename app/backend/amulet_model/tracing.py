@@ -0,0 +1,118 @@
+"""
+Trace-event export for individual solver runs. A SearchTracer collects the
+same counters as SearchTelemetry, and also records a span for each turn,
+search phase, and effect handler, plus a running count of the frontier size.
+The output is Chrome's trace-event JSON, which can be opened in
+chrome://tracing or ui.perfetto.dev.
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+from .telemetry import SearchTelemetry
+
+
+# A slow opener makes a few hundred thousand events. Past this, stop recording
+# so the trace file stays around 10MB, which a viewer can still open
+_MAX_EVENTS = 100000
+
+
+class SearchTracer(SearchTelemetry):
+    def __init__(self):
+        super().__init__()
+        self.events: List[Dict[str, Any]] = []
+        self.n_dropped = 0
+        self._t0 = time.perf_counter()
+        self._turn_name = ""
+
+    def start_turn(self, turn: int) -> None:
+        super().start_turn(turn)
+        self._turn_name = f"turn {turn}"
+
+    def end_turn(self) -> None:
+        super().end_turn()
+        turn = self.turns[-1]
+        self._add_span(
+            self._turn_name,
+            "turn",
+            self._turn_start,
+            time.perf_counter(),
+            expanded=turn["expanded"],
+            generated=turn["generated"],
+            duplicates=turn["duplicates"],
+        )
+
+    def end_phase(self, name: str, started: float) -> None:
+        self._add_span(name, "phase", started, time.perf_counter())
+
+    def count_frontier(
+        self, n_duplicates: int, n_frontier: int, started: float
+    ) -> None:
+        super().count_frontier(n_duplicates, n_frontier, started)
+        self._add_event(
+            {
+                "name": "frontier",
+                "ph": "C",
+                "ts": self._to_micros(time.perf_counter()),
+                "args": {"states": n_frontier},
+            }
+        )
+
+    def count_effect(self, name: str, seconds: float) -> None:
+        super().count_effect(name, seconds)
+        finished = time.perf_counter()
+        self._add_span(name, "effect", finished - seconds, finished)
+
+    def to_trace(self) -> Dict[str, Any]:
+        return {
+            "traceEvents": self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": self.n_dropped},
+        }
+
+    def write(self, path: str) -> None:
+        # Write to a temp file first so a viewer never sees half a trace
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump(self.to_trace(), handle, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def _add_span(
+        self, name: str, category: str, started: float, finished: float, **args: Any
+    ) -> None:
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": self._to_micros(started),
+            "dur": round(1e6 * (finished - started), 3),
+        }
+        if args:
+            event["args"] = args
+        self._add_event(event)
+
+    def _add_event(self, event: Dict[str, Any]) -> None:
+        if len(self.events) >= _MAX_EVENTS:
+            if not self.n_dropped:
+                # Mark where the trace stops, so it doesn't look like the
+                # search just went quiet
+                self.events.append(
+                    {
+                        "name": "trace truncated",
+                        "ph": "i",
+                        "s": "g",
+                        "ts": event["ts"],
+                        "pid": 1,
+                        "tid": 1,
+                    }
+                )
+            self.n_dropped += 1
+            return
+        event["pid"] = 1
+        event["tid"] = 1
+        self.events.append(event)
+
+    def _to_micros(self, t: float) -> float:
+        return round(1e6 * (t - self._t0), 3)
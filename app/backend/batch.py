@@ -0,0 +1,302 @@
+"""
+Batch evaluation of openers, for offline analysis and other tools. POST a
+JSON body to /api/evaluate like:
+
+    {
+        "openers": [
+            {"hand": ["Forest", ...], "on_the_play": true, "samples": 20},
+            ...
+        ],
+        "deck": "default",
+        "lines": false
+    }
+
+Each opener's library is the rest of the deck. Identical hands are only
+played out once. The response has each opener's kill turns over its samples
+("none" if it didn't cast Titan by turn three) and, with "lines", the last
+sample's line of play.
+
+Everything is capped: the size of the request, the number of openers, the
+samples per opener and in total, and the time for the whole batch. The
+openers are played out in parallel in their own pool of low-priority
+processes, so a batch only gets the CPU the interactive solves aren't using.
+Each process runs one batch at a time, and a batch counts as running until
+every opener it started is done, even if its request has gone away.
+"""
+
+import asyncio
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from django.conf import settings
+
+from . import metrics
+from .admission import ServerBusy
+from .amulet_model import GameManager
+from .amulet_model.deck import DEFAULT_DECK, get_deck
+from .amulet_model.game_manager import ModelInputDict, ModelOutputDict
+
+
+# Like the speculative solves, stay out of the way of the interactive ones
+_NICENESS = 10
+
+# Workers give up at the deadline on their own. This is in case they can't
+_GRACE_SECONDS = 5
+
+_MAX_HAND_SIZE = 7
+
+
+class Opener(NamedTuple):
+    hand: Tuple[str, ...]
+    on_the_play: bool
+    samples: int
+
+
+class BatchRequest(NamedTuple):
+    openers: List[Opener]
+    deck: str
+    lines: bool
+
+
+# Sorted hand and play/draw. Order doesn't matter in a hand, so it shouldn't
+# get in the way of spotting duplicates
+_Key = Tuple[Tuple[str, ...], bool]
+
+
+_LOCK = threading.Lock()
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+# Held while a batch is running
+_BATCH_LOCK = threading.Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ProcessPoolExecutor(
+                max_workers=settings.EVALUATE_WORKERS,
+                initializer=os.nice,
+                initargs=(_NICENESS,),
+            )
+        return _EXECUTOR
+
+
+def reset_executor() -> None:
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _EXECUTOR = None
+
+
+def parse_request(data: Any) -> BatchRequest:
+    if not isinstance(data, dict) or not isinstance(data.get("openers"), list):
+        raise ValueError("expected an object with a list of openers")
+    deck = data.get("deck", DEFAULT_DECK)
+    if not isinstance(deck, str):
+        raise ValueError("deck must be a string")
+    deck_counts = _count(get_deck(deck).cards)
+    n_openers = len(data["openers"])
+    if not 1 <= n_openers <= settings.EVALUATE_MAX_OPENERS:
+        raise ValueError(f"expected 1 to {settings.EVALUATE_MAX_OPENERS} openers")
+    openers = [_parse_opener(x, deck_counts) for x in data["openers"]]
+    # Duplicates get played out once, so count them once
+    n_samples = sum(_get_unique_openers(openers).values())
+    if n_samples > settings.EVALUATE_MAX_TOTAL_SAMPLES:
+        raise ValueError(
+            f"too many samples: {n_samples} (at most"
+            f" {settings.EVALUATE_MAX_TOTAL_SAMPLES} per request)"
+        )
+    return BatchRequest(openers=openers, deck=deck, lines=bool(data.get("lines")))
+
+
+async def evaluate(request: BatchRequest) -> List[Dict[str, Any]]:
+    if not _BATCH_LOCK.acquire(blocking=False):
+        metrics.increment("amulet_solver_rejected_total", reason="batch_busy")
+        raise ServerBusy("a batch is already running")
+    # Filled in as the openers are submitted
+    futures: Dict[_Key, "Future[Optional[ModelOutputDict]]"] = {}
+    try:
+        return await _evaluate(request, futures)
+    finally:
+        _release_when_done(list(futures.values()))
+
+
+def _release_when_done(futures: List["Future[Any]"]) -> None:
+    # An opener that's already being played out can't be called back. Keep
+    # the batch going until it's done, so the next batch doesn't pile its
+    # openers on top of ours
+    pending = [f for f in futures if not f.done()]
+    if not pending:
+        _BATCH_LOCK.release()
+        return
+    n_pending = [len(pending)]
+    count_lock = threading.Lock()
+
+    def on_done(_: "Future[Any]") -> None:
+        # Called from the executor's thread
+        with count_lock:
+            n_pending[0] -= 1
+            if n_pending[0]:
+                return
+        _BATCH_LOCK.release()
+
+    for future in pending:
+        future.add_done_callback(on_done)
+
+
+async def _evaluate(
+    request: BatchRequest, futures: Dict[_Key, "Future[Optional[ModelOutputDict]]"]
+) -> List[Dict[str, Any]]:
+    deadline = time.time() + settings.EVALUATE_MAX_SECONDS
+    deck_cards = get_deck(request.deck).cards
+    unique = _get_unique_openers(request.openers)
+    executor = get_executor()
+    for (hand, on_the_play), samples in unique.items():
+        model_input: ModelInputDict = {
+            "opener": {
+                "hand": list(hand),
+                "library": _remove(deck_cards, hand),
+                "on_the_play": on_the_play,
+            },
+            "stats": {i: 0 for i in range(1, 6)},
+        }
+        futures[hand, on_the_play] = executor.submit(
+            _run_in_worker, model_input, samples, deadline, _get_solver_kwargs()
+        )
+    try:
+        await asyncio.wait(
+            [asyncio.wrap_future(f) for f in futures.values()],
+            timeout=deadline - time.time() + _GRACE_SECONDS,
+        )
+    finally:
+        # Past the deadline, or the client went away. Don't start anything new
+        for future in futures.values():
+            future.cancel()
+    outputs: Dict[_Key, Optional[ModelOutputDict]] = {}
+    for key, future in futures.items():
+        if not future.done() or future.cancelled():
+            outputs[key] = None
+            continue
+        try:
+            outputs[key] = future.result()
+        except BrokenProcessPool:
+            reset_executor()
+            raise
+    results = []
+    for opener in request.openers:
+        model_output = outputs[_get_key(opener)]
+        results.append(_format_result(opener, model_output, request.lines))
+    n_samples = sum(r["samples"] for r in results)
+    metrics.increment("amulet_evaluate_samples_total", n_samples)
+    return results
+
+
+def _parse_opener(data: Any, deck_counts: Dict[str, int]) -> Opener:
+    if not isinstance(data, dict):
+        raise ValueError("each opener must be an object")
+    hand = data.get("hand")
+    if not isinstance(hand, list) or not all(isinstance(c, str) for c in hand):
+        raise ValueError("hand must be a list of card names")
+    if not 1 <= len(hand) <= _MAX_HAND_SIZE:
+        raise ValueError(f"hand must have 1 to {_MAX_HAND_SIZE} cards")
+    for card_name, count in _count(hand).items():
+        if count > deck_counts.get(card_name, 0):
+            raise ValueError(f"deck doesn't have enough copies of {repr(card_name)}")
+    on_the_play = data.get("on_the_play")
+    if not isinstance(on_the_play, bool):
+        raise ValueError("on_the_play must be true or false")
+    samples = data.get("samples", 1)
+    # bool is an int too, but true samples is surely a mistake
+    if not isinstance(samples, int) or isinstance(samples, bool):
+        raise ValueError("samples must be an integer")
+    if not 1 <= samples <= settings.EVALUATE_MAX_SAMPLES:
+        raise ValueError(f"samples must be 1 to {settings.EVALUATE_MAX_SAMPLES}")
+    return Opener(hand=tuple(hand), on_the_play=on_the_play, samples=samples)
+
+
+def _get_key(opener: Opener) -> _Key:
+    return tuple(sorted(opener.hand)), opener.on_the_play
+
+
+def _get_unique_openers(openers: List[Opener]) -> Dict[_Key, int]:
+    # Each distinct opener, and the most samples anyone asked for
+    unique: Dict[_Key, int] = {}
+    for opener in openers:
+        key = _get_key(opener)
+        unique[key] = max(unique.get(key, 0), opener.samples)
+    return unique
+
+
+def _format_result(
+    opener: Opener, model_output: Optional[ModelOutputDict], lines: bool
+) -> Dict[str, Any]:
+    # A batch's only time limit is the deadline. If the example ran into it,
+    # it was the only shuffle, and it got cut off partway through
+    if model_output is not None and model_output["search"]["timed_out"]:
+        model_output = None
+    stats = {i: 0 for i in range(1, 6)}
+    if model_output is not None:
+        stats = model_output["stats"]
+    n_samples = sum(stats.values())
+    result: Dict[str, Any] = {
+        "hand": list(opener.hand),
+        "on_the_play": opener.on_the_play,
+        "samples": n_samples,
+        # Turn 5 is where we count hands that didn't get there
+        "kill_turns": {
+            **{str(turn): stats[turn] for turn in range(1, 5)},
+            "none": stats[5],
+        },
+        # False if the batch ran out of time first
+        "complete": n_samples >= opener.samples,
+    }
+    if lines:
+        result["line"] = None
+        if model_output is not None:
+            text = "".join(n.dump() for n in model_output["summary"]["notes"])
+            result["line"] = [line for line in text.splitlines() if line.strip()]
+    return result
+
+
+def _count(cards: Iterable[str]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for card_name in cards:
+        counts[card_name] = counts.get(card_name, 0) + 1
+    return counts
+
+
+def _remove(cards: Tuple[str, ...], hand: Tuple[str, ...]) -> List[str]:
+    library = list(cards)
+    for card_name in hand:
+        library.remove(card_name)
+    return library
+
+
+def _get_solver_kwargs() -> Dict[str, Any]:
+    # Each sample gets the same budget as an interactive solve. The time
+    # limit is the deadline for the whole batch
+    return {
+        "max_frontier_bytes": settings.SOLVER_MAX_FRONTIER_BYTES,
+        "max_expansions": settings.SOLVER_MAX_EXPANSIONS,
+        "beam_width": settings.SOLVER_BEAM_WIDTH,
+    }
+
+
+def _run_in_worker(
+    model_input: ModelInputDict,
+    samples: int,
+    deadline: float,
+    kwargs: Dict[str, Any],
+) -> Optional[ModelOutputDict]:
+    # Runs in a batch process. The opener may have waited its turn for a
+    # while, so figure out how much time is left now
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        return None
+    return GameManager.run(
+        model_input, samples=samples, max_wait_seconds=remaining, **kwargs
+    )
@@ -0,0 +1,232 @@
+"""
+Load test for the API. Run from app/ with:
+
+    python -m backend.loadtest
+    python -m backend.loadtest --url http://localhost:8000
+
+Without --url, requests go through Django's test client in this process.
+That's handy for a quick check, but every worker shares one interpreter, so
+it behaves like a single sync gunicorn worker. Point --url at a running
+server to measure the real deployment.
+
+Each worker thread sends a mix of /api/opener, /api/play, and /api/about
+requests, like a user dealing openers and playing them out. Play requests
+reuse the hx-vals payloads from opener responses, so the solver sees real
+hands. For each concurrency level we report throughput, latency
+percentiles, how often the solver gave up (ran out of time, expansions, or
+memory) rather than finishing its search, and the error rate.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+
+_DEFAULT_CONCURRENCY = [1, 2, 4, 8]
+_DEFAULT_DURATION = 20.0
+_DEFAULT_REQUEST_TIMEOUT = 60.0
+
+# Most traffic is people playing out hands. Every so often they deal a new
+# one or read the about page
+_MIX = {"opener": 3, "play": 6, "about": 1}
+
+# Kept small so we don't slam the server before the first level starts
+_N_WARMUP_OPENERS = 8
+
+# The play button's payload in particular. The teaser's "play it out more
+# times" link carries one too, but it asks for many shuffles at once
+_PLAY_VALS_PATTERN = re.compile(r"<button id='play-button'[^>]*hx-vals='([^']*)'")
+
+# How the summary marks a search that gave up partway through, for any
+# reason. A hand that really can't win by the last turn gets a tombstone too,
+# but that's an answer, not a give-up
+_GAVE_UP_PATTERN = re.compile(r"FAILED: (?!NO SOLUTION WITHIN)")
+
+
+Fetch = Callable[[str], Tuple[int, str]]
+
+
+class Sample(NamedTuple):
+    endpoint: str
+    seconds: float
+    is_error: bool
+    gave_up: bool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load test the API")
+    parser.add_argument("--url", help="base URL of a running server")
+    parser.add_argument(
+        "-c", "--concurrency", type=int, nargs="+", default=_DEFAULT_CONCURRENCY
+    )
+    parser.add_argument(
+        "-d", "--duration", type=float, default=_DEFAULT_DURATION, help="per level"
+    )
+    parser.add_argument(
+        "--max-p95",
+        type=float,
+        help="stop ramping up once play p95 latency passes this many seconds",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    fetch = get_http_fetch(args.url) if args.url else get_in_process_fetch()
+    payloads = PayloadPool(fetch, random.Random(args.seed))
+    print(format_header())
+    for concurrency in args.concurrency:
+        samples = run_level(fetch, payloads, concurrency, args.duration, args.seed)
+        print(format_row(concurrency, samples, args.duration))
+        play_ms = [s.seconds for s in samples if s.endpoint == "play"]
+        if args.max_p95 and play_ms and percentile(play_ms, 95) > args.max_p95:
+            print(f"play p95 passed {args.max_p95}s, stopping")
+            break
+
+
+def get_http_fetch(base_url: str) -> Fetch:
+    def fetch(path: str) -> Tuple[int, str]:
+        url = base_url.rstrip("/") + path
+        try:
+            with urlopen(url, timeout=_DEFAULT_REQUEST_TIMEOUT) as response:
+                return response.status, response.read().decode()
+        except HTTPError as e:
+            return e.code, ""
+        except (URLError, OSError):
+            return 0, ""
+
+    return fetch
+
+
+def get_in_process_fetch() -> Fetch:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    import django
+
+    django.setup()
+    from django.test import Client
+
+    # The test client isn't thread safe, so give each worker its own
+    local = threading.local()
+
+    def fetch(path: str) -> Tuple[int, str]:
+        if not hasattr(local, "client"):
+            local.client = Client(HTTP_HOST="localhost")
+        response = local.client.get(path)
+        return response.status_code, response.content.decode()
+
+    return fetch
+
+
+class PayloadPool:
+    """
+    hx-vals payloads scraped from opener responses, to replay as play
+    requests.
+    """
+
+    def __init__(self, fetch: Fetch, rng: random.Random):
+        self._lock = threading.Lock()
+        self._payloads: List[Dict[str, str]] = []
+        self._rng = rng
+        for _ in range(_N_WARMUP_OPENERS):
+            status, body = fetch("/api/opener")
+            if status == 200:
+                self.add_from(body)
+        if not self._payloads:
+            raise RuntimeError("unable to get any openers from the server")
+
+    def add_from(self, body: str) -> None:
+        match = _PLAY_VALS_PATTERN.search(body)
+        if match:
+            with self._lock:
+                self._payloads.append(json.loads(match.group(1)))
+
+    def choose(self) -> Dict[str, str]:
+        with self._lock:
+            return self._rng.choice(self._payloads)
+
+
+def run_level(
+    fetch: Fetch, payloads: PayloadPool, concurrency: int, duration: float, seed: int
+) -> List[Sample]:
+    samples: List[Sample] = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def work(rng: random.Random) -> None:
+        endpoints, weights = zip(*_MIX.items())
+        while time.perf_counter() < stop_at:
+            endpoint = rng.choices(endpoints, weights)[0]
+            sample = send(fetch, payloads, endpoint)
+            with lock:
+                samples.append(sample)
+
+    threads = [
+        threading.Thread(target=work, args=(random.Random(seed + i),))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def send(fetch: Fetch, payloads: PayloadPool, endpoint: str) -> Sample:
+    path = f"/api/{endpoint}"
+    if endpoint == "play":
+        path += "?" + urlencode(payloads.choose())
+    t0 = time.perf_counter()
+    status, body = fetch(path)
+    seconds = time.perf_counter() - t0
+    if endpoint == "opener" and status == 200:
+        payloads.add_from(body)
+    return Sample(
+        endpoint=endpoint,
+        seconds=seconds,
+        is_error=status != 200,
+        gave_up=_GAVE_UP_PATTERN.search(body) is not None,
+    )
+
+
+def format_header() -> str:
+    cols = ["workers", "requests", "req/s", "p50 ms", "p95 ms", "p99 ms"]
+    cols += ["play p95", "gave up", "errors"]
+    return "".join(c.rjust(10) for c in cols)
+
+
+def format_row(concurrency: int, samples: List[Sample], duration: float) -> str:
+    if not samples:
+        return str(concurrency).rjust(10) + "no requests finished".rjust(20)
+    ms = [1000 * s.seconds for s in samples]
+    play = [s for s in samples if s.endpoint == "play"]
+    play_ms = [1000 * s.seconds for s in play]
+    n_gave_up = sum(1 for s in play if s.gave_up)
+    n_errors = sum(1 for s in samples if s.is_error)
+    cols = [
+        str(concurrency),
+        str(len(samples)),
+        f"{len(samples) / duration:.1f}",
+        f"{percentile(ms, 50):.0f}",
+        f"{percentile(ms, 95):.0f}",
+        f"{percentile(ms, 99):.0f}",
+        f"{percentile(play_ms, 95):.0f}" if play_ms else "-",
+        f"{100 * n_gave_up / len(play):.1f}%" if play else "-",
+        f"{100 * n_errors / len(samples):.1f}%",
+    ]
+    return "".join(c.rjust(10) for c in cols)
+
+
+def percentile(values: List[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+Request and solver metrics, published at /api/metrics in the Prometheus text
+format.
+
+Gunicorn runs several worker processes, and each one only sees its own
+requests. Each process keeps its metrics in memory and every few seconds
+writes them to its own JSON file in settings.METRICS_DIR. The metrics view
+adds up the files from every process.
+
+Each file is named for its process's PID and start time, since PIDs get
+reused. When the metrics view finds a file from a process that has exited,
+it folds the counters and histograms into a retired.json file and deletes
+the original. So totals don't go backwards when gunicorn recycles a worker,
+and the directory doesn't keep growing.
+
+/api/metrics is for the scraper on the host. nginx doesn't pass it through.
+"""
+
+import asyncio
+import contextlib
+import fcntl
+import functools
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypedDict
+import uuid
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+
+from .amulet_model.game_manager import ModelOutputDict, SearchInfoDict
+from .amulet_model.search_budget import SearchMode
+
+
+class HistogramDict(TypedDict):
+    # One count per bucket, not cumulative. The last bucket is +Inf
+    buckets: List[int]
+    sum: float
+    count: int
+
+
+class MetricsDict(TypedDict):
+    # Metric name -> label string (like 'view="about"') -> value
+    counters: Dict[str, Dict[str, float]]
+    gauges: Dict[str, Dict[str, float]]
+    histograms: Dict[str, Dict[str, HistogramDict]]
+
+
+_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+_EXPANDED_BUCKETS = [10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000]
+_SIZE_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576]
+
+_HISTOGRAMS: Dict[str, Tuple[str, List[float]]] = {
+    "amulet_request_duration_seconds": (
+        "Time spent in each view",
+        _LATENCY_BUCKETS,
+    ),
+    "amulet_response_size_bytes": (
+        "Size of each response body",
+        _SIZE_BUCKETS,
+    ),
+    "amulet_solver_duration_seconds": (
+        "Time spent solving each opener",
+        _LATENCY_BUCKETS,
+    ),
+    "amulet_solver_states_expanded": (
+        "Game states expanded for each opener",
+        _EXPANDED_BUCKETS,
+    ),
+    "amulet_solver_queue_seconds": (
+        "Time each admitted solve spent waiting for a slot",
+        _LATENCY_BUCKETS,
+    ),
+}
+
+_COUNTERS: Dict[str, str] = {
+    "amulet_solver_incomplete_total": "Solves that gave up, by what they ran out of",
+    "amulet_solver_kills_total": "Solves by the turn they cast Titan (or none)",
+    "amulet_solver_rejected_total": "Solves turned away because the server was busy",
+    "amulet_solver_fallbacks_total": "Solves run locally because the service failed",
+    "amulet_presolve_started_total": "Speculative solves started",
+    "amulet_presolve_skipped_total": "Hands not solved ahead because the line was full",
+    "amulet_presolve_lookups_total": "Plays by whether a speculative solve was ready",
+    "amulet_presolve_wasted_total": "Speculative solves nobody used",
+    "amulet_presolve_wasted_seconds_total": "Time spent on speculative solves nobody used",
+    "amulet_evaluate_samples_total": "Shuffles played out by /api/evaluate",
+}
+
+# Gauges from workers that have exited are dropped rather than added up
+_GAUGES: Dict[str, str] = {
+    "amulet_solver_active": "Solves in progress",
+    "amulet_solver_queue_depth": "Solves waiting for a slot",
+}
+
+_FILE_PREFIX = "metrics-"
+# Everything from processes that have exited
+_RETIRED_FILE = "retired.json"
+_LOCK_FILE = "collect.lock"
+
+
+def _get_start_time(pid: int) -> Optional[str]:
+    # Linux only. A PID gets reused, but not with the same start time
+    try:
+        with open(f"/proc/{pid}/stat") as handle:
+            stat = handle.read()
+    except OSError:
+        return None
+    # The command name is in parentheses and may have spaces. Start time is
+    # the 22nd field, the 20th after the name
+    return stat.rsplit(")", 1)[1].split()[19]
+
+
+class _ProcessMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        # Without /proc, fall back on something that's at least unique
+        start_time = _get_start_time(self.pid) or uuid.uuid4().hex
+        self.key = f"{self.pid}-{start_time}"
+        self.data: MetricsDict = {"counters": {}, "gauges": {}, "histograms": {}}
+        self.last_flush = 0.0
+
+    def check_pid(self) -> None:
+        # After a fork, the parent's counts belong to the parent's file
+        if os.getpid() != self.pid:
+            self.__init__()
+
+
+_METRICS = _ProcessMetrics()
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    bounds = _HISTOGRAMS[name][1]
+    index = len(bounds)
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            index = i
+            break
+    _METRICS.check_pid()
+    with _METRICS.lock:
+        series = _METRICS.data["histograms"].setdefault(name, {})
+        key = _format_labels(labels)
+        if key not in series:
+            series[key] = {"buckets": [0] * (len(bounds) + 1), "sum": 0.0, "count": 0}
+        histogram = series[key]
+        histogram["buckets"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def increment(name: str, amount: float = 1, **labels: str) -> None:
+    _METRICS.check_pid()
+    with _METRICS.lock:
+        series = _METRICS.data["counters"].setdefault(name, {})
+        key = _format_labels(labels)
+        series[key] = series.get(key, 0) + amount
+
+
+def set_gauge(name: str, value: float, **labels: str) -> None:
+    _METRICS.check_pid()
+    with _METRICS.lock:
+        series = _METRICS.data["gauges"].setdefault(name, {})
+        series[_format_labels(labels)] = value
+
+
+def observe_solve(model_output: ModelOutputDict, seconds: float) -> None:
+    search = model_output["search"]
+    observe("amulet_solver_duration_seconds", seconds)
+    observe("amulet_solver_states_expanded", search["expanded"])
+    if not search["complete"]:
+        increment("amulet_solver_incomplete_total", reason=_get_give_up_reason(search))
+    turn = model_output["summary"]["turn"]
+    increment("amulet_solver_kills_total", turn=str(turn) if turn > 0 else "none")
+
+
+def _get_give_up_reason(search: SearchInfoDict) -> str:
+    if search["timed_out"]:
+        return "timed_out"
+    # The frontier outgrew the memory cap even after a beam search
+    if search["mode"] == SearchMode.ABANDONED.value:
+        return "memory"
+    return "expansions"
+
+
+def instrument(view: Callable[..., Any]) -> Callable[..., Any]:
+    # Django only treats a view as async if the wrapper is a coroutine too
+    if asyncio.iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def async_wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+            t0 = time.perf_counter()
+            response = await view(request, *args, **kwargs)
+            _observe_response(view.__name__, response, time.perf_counter() - t0)
+            return response
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        t0 = time.perf_counter()
+        response = view(request, *args, **kwargs)
+        _observe_response(view.__name__, response, time.perf_counter() - t0)
+        return response
+
+    return wrapper
+
+
+def _observe_response(name: str, response: HttpResponse, seconds: float) -> None:
+    observe("amulet_request_duration_seconds", seconds, view=name)
+    # Streamed responses don't have a size up front
+    if not response.streaming:
+        observe("amulet_response_size_bytes", len(response.content), view=name)
+    flush()
+
+
+def flush(force: bool = False) -> None:
+    # Writing a file on every request would cost more than the requests
+    now = time.monotonic()
+    if not force and now - _METRICS.last_flush < settings.METRICS_FLUSH_SECONDS:
+        return
+    _METRICS.check_pid()
+    with _METRICS.lock:
+        content = json.dumps(_METRICS.data)
+        _METRICS.last_flush = now
+    metrics_dir = Path(settings.METRICS_DIR)
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    _write(metrics_dir / f"{_FILE_PREFIX}{_METRICS.key}.json", content)
+
+
+def collect() -> MetricsDict:
+    flush(force=True)
+    metrics_dir = Path(settings.METRICS_DIR)
+    total = _get_empty()
+    # Only one process at a time gets to retire files, or they'd be counted
+    # twice
+    with _lock(metrics_dir / _LOCK_FILE):
+        retired = _load(metrics_dir / _RETIRED_FILE) or _get_empty()
+        _merge(total, retired)
+        dead_paths = []
+        for path in sorted(metrics_dir.glob(f"{_FILE_PREFIX}*.json")):
+            data = _load(path)
+            if data is None:
+                continue
+            if not _is_alive(path.stem[len(_FILE_PREFIX) :]):
+                # Its gauges are stale, but the rest still counts
+                data["gauges"] = {}
+                _merge(retired, data)
+                dead_paths.append(path)
+            _merge(total, data)
+        if dead_paths:
+            _write(metrics_dir / _RETIRED_FILE, json.dumps(retired))
+            for path in dead_paths:
+                path.unlink()
+    return total
+
+
+def _get_empty() -> MetricsDict:
+    return {"counters": {}, "gauges": {}, "histograms": {}}
+
+
+def _load(path: Path) -> Optional[MetricsDict]:
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        # Missing, or another process is halfway through replacing it
+        return None
+
+
+def _write(path: Path, content: str) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as handle:
+        handle.write(content)
+    os.replace(tmp_path, path)
+
+
+@contextlib.contextmanager
+def _lock(path: Path) -> Iterator[None]:
+    with open(path, "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _is_alive(key: str) -> bool:
+    pid, _, start_time = key.partition("-")
+    if not pid.isdigit():
+        return False
+    if os.path.isdir("/proc"):
+        return _get_start_time(int(pid)) == start_time
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(total: MetricsDict, data: MetricsDict) -> None:
+    for kind in ["counters", "gauges"]:
+        # Files from before gauges existed won't have any
+        for name, series in data.get(kind, {}).items():
+            total_series = total[kind].setdefault(name, {})
+            for key, value in series.items():
+                total_series[key] = total_series.get(key, 0) + value
+    for name, hseries in data["histograms"].items():
+        total_hseries = total["histograms"].setdefault(name, {})
+        for key, histogram in hseries.items():
+            if key not in total_hseries:
+                total_hseries[key] = {
+                    "buckets": [0] * len(histogram["buckets"]),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            total_histogram = total_hseries[key]
+            for i, n in enumerate(histogram["buckets"]):
+                total_histogram["buckets"][i] += n
+            total_histogram["sum"] += histogram["sum"]
+            total_histogram["count"] += histogram["count"]
+
+
+def render(data: MetricsDict) -> str:
+    lines = []
+    simple_metrics = [
+        ("counter", _COUNTERS, data["counters"]),
+        ("gauge", _GAUGES, data["gauges"]),
+    ]
+    for kind, metrics, values in simple_metrics:
+        for name, help_text in metrics.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for key, value in sorted(values.get(name, {}).items()):
+                lines.append(f"{name}{_wrap_labels(key)} {_format_value(value)}")
+    for name, (help_text, bounds) in _HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for key, histogram in sorted(data["histograms"].get(name, {}).items()):
+            cumulative = 0
+            for bound, n in zip(bounds + [None], histogram["buckets"]):
+                cumulative += n
+                le = "+Inf" if bound is None else _format_value(bound)
+                labels = _wrap_labels(_join_labels(key, f'le="{le}"'))
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _wrap_labels(key)
+            lines.append(f"{name}_sum{labels} {_format_value(histogram['sum'])}")
+            lines.append(f"{name}_count{labels} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    return ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+
+def _join_labels(*keys: str) -> str:
+    return ",".join(k for k in keys if k)
+
+
+def _wrap_labels(key: str) -> str:
+    return "{" + key + "}" if key else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
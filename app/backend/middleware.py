@@ -0,0 +1,46 @@
+"""
+The only middleware on the /api/ path, in place of the full MIDDLEWARE list
+(see core/asgi.py).
+
+The API views don't use sessions, auth, or messages. They're GETs, except
+for POST /api/evaluate, which is marked csrf_exempt for scripts and other
+tools, so CSRF has nothing to check either. Most of Django's middleware is
+written as sync hooks, so under ASGI each one costs a hop to a thread and
+back on every request. This is async-only, so it doesn't.
+
+There are no CORS headers on purpose. The frontend calls the API from its
+own origin, and /api/evaluate is meant for scripts, not for pages on other
+sites. The full stack doesn't allow any origins either (there's no
+CORS_ALLOWED_ORIGINS), so this matches it.
+"""
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.utils.decorators import async_only_middleware
+
+
+@async_only_middleware
+def api_middleware(get_response):
+    async def middleware(request: HttpRequest) -> HttpResponse:
+        # Resolve against the API routes only, so the admin never gets loaded
+        request.urlconf = "core.api_urls"
+        response = await get_response(request)
+        # The headers we'd otherwise get from SecurityMiddleware and
+        # XFrameOptionsMiddleware
+        if settings.SECURE_CONTENT_TYPE_NOSNIFF:
+            response.headers.setdefault("X-Content-Type-Options", "nosniff")
+        if settings.SECURE_REFERRER_POLICY:
+            response.headers.setdefault(
+                "Referrer-Policy", settings.SECURE_REFERRER_POLICY
+            )
+        if settings.SECURE_CROSS_ORIGIN_OPENER_POLICY:
+            response.headers.setdefault(
+                "Cross-Origin-Opener-Policy", settings.SECURE_CROSS_ORIGIN_OPENER_POLICY
+            )
+        response.headers.setdefault("X-Frame-Options", settings.X_FRAME_OPTIONS)
+        # Like CommonMiddleware
+        if not response.streaming and "Content-Length" not in response.headers:
+            response.headers["Content-Length"] = str(len(response.content))
+        return response
+
+    return middleware
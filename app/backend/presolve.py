@@ -0,0 +1,183 @@
+"""
+Speculative solves, so "play it out" can answer right away.
+
+Dealing a hand is cheap, but playing it out means a solve. While the user is
+still looking at a freshly dealt hand, a background pool solves it. When
+they click the button, the answer is usually waiting. Each play gets the
+next shuffle going too, for the first settings.PRESOLVE_SHUFFLES plays of a
+hand.
+
+Results are keyed by opener token (the hand, the library, and the stats so
+far), and each one is used at most once. They expire after
+settings.PRESOLVE_TTL_SECONDS. On a miss, the view solves live like before.
+
+The background pool is separate from the solver pool, and its processes run
+at a lower priority, so live solves get the CPU first. Its line is short.
+Past settings.PRESOLVE_MAX_PENDING solves waiting or running, new hands just
+don't get solved ahead of time. Like the solver pool, this is all per
+process.
+"""
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import copy
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional
+from django.conf import settings
+
+from . import metrics
+from .amulet_model import GameManager, opener_token
+from .amulet_model.game_manager import ModelInputDict, ModelOutputDict
+
+
+# Live solves should always win a fight over the CPU
+_NICENESS = 10
+
+
+class _Result(NamedTuple):
+    model_output: ModelOutputDict
+    seconds: float
+
+
+class _Entry(NamedTuple):
+    future: "Future[_Result]"
+    expires: float
+
+
+_LOCK = threading.Lock()
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+# Oldest first. They all live for the same TTL, so that's also the order they
+# expire in
+_ENTRIES: "OrderedDict[str, _Entry]" = OrderedDict()
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    global _EXECUTOR
+    if not settings.PRESOLVE_WORKERS:
+        return None
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ProcessPoolExecutor(
+                max_workers=settings.PRESOLVE_WORKERS,
+                initializer=os.nice,
+                initargs=(_NICENESS,),
+            )
+        return _EXECUTOR
+
+
+def reset_executor() -> None:
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _EXECUTOR = None
+        _ENTRIES.clear()
+
+
+def schedule(model_input: ModelInputDict) -> None:
+    if sum(model_input["stats"].values()) >= settings.PRESOLVE_SHUFFLES:
+        return
+    executor = get_executor()
+    if executor is None:
+        return
+    key = opener_token.encode(model_input)
+    now = time.monotonic()
+    with _LOCK:
+        _expire(now)
+        if key in _ENTRIES:
+            return
+        n_pending = sum(not entry.future.done() for entry in _ENTRIES.values())
+        if n_pending >= settings.PRESOLVE_MAX_PENDING:
+            metrics.increment("amulet_presolve_skipped_total")
+            return
+        while len(_ENTRIES) >= settings.PRESOLVE_MAX_ENTRIES:
+            _discard(_ENTRIES.popitem(last=False)[1], "evicted")
+        # The executor pickles the arguments later, in another thread, so
+        # don't hand it anything the caller might still change
+        model_input = copy.deepcopy(model_input)
+        try:
+            future = executor.submit(_solve, model_input, _get_solver_kwargs())
+        except BrokenProcessPool:
+            future = None
+        else:
+            _ENTRIES[key] = _Entry(future, now + settings.PRESOLVE_TTL_SECONDS)
+    if future is None:
+        reset_executor()
+        return
+    metrics.increment("amulet_presolve_started_total")
+
+
+def schedule_next(model_output: ModelOutputDict) -> None:
+    # The stats went up by one, so the button now carries a different token
+    schedule({"opener": model_output["opener"], "stats": model_output["stats"]})
+
+
+async def take(model_input: ModelInputDict) -> Optional[ModelOutputDict]:
+    if not settings.PRESOLVE_WORKERS:
+        return None
+    key = opener_token.encode(model_input)
+    with _LOCK:
+        _expire(time.monotonic())
+        entry = _ENTRIES.pop(key, None)
+    # If it's still waiting for a process, a live solve will beat it
+    if entry is None or entry.future.cancel():
+        metrics.increment("amulet_presolve_lookups_total", result="miss")
+        return None
+    # Otherwise it's had a head start, so wait for it rather than start over
+    result = "hit" if entry.future.done() else "running"
+    metrics.increment("amulet_presolve_lookups_total", result=result)
+    try:
+        return (await asyncio.wrap_future(entry.future)).model_output
+    except BrokenProcessPool:
+        reset_executor()
+    except Exception:
+        _LOGGER.exception("speculative solve failed")
+    return None
+
+
+def _expire(now: float) -> None:
+    while _ENTRIES:
+        entry = next(iter(_ENTRIES.values()))
+        if entry.expires > now:
+            break
+        _ENTRIES.popitem(last=False)
+        _discard(entry, "expired")
+
+
+def _discard(entry: _Entry, reason: str) -> None:
+    # Nothing's wasted if it never started
+    if not entry.future.cancel():
+        entry.future.add_done_callback(functools.partial(_count_waste, reason))
+
+
+def _count_waste(reason: str, future: "Future[_Result]") -> None:
+    if future.cancelled() or future.exception() is not None:
+        return
+    metrics.increment("amulet_presolve_wasted_total", reason=reason)
+    seconds = future.result().seconds
+    metrics.increment("amulet_presolve_wasted_seconds_total", seconds, reason=reason)
+
+
+def _get_solver_kwargs() -> Dict[str, Any]:
+    # The same limits as a live solve that didn't have to wait in line
+    return {
+        "max_wait_seconds": settings.SOLVER_MAX_WAIT_SECONDS,
+        "max_frontier_bytes": settings.SOLVER_MAX_FRONTIER_BYTES,
+        "max_expansions": settings.SOLVER_MAX_EXPANSIONS,
+        "beam_width": settings.SOLVER_BEAM_WIDTH,
+    }
+
+
+def _solve(model_input: ModelInputDict, kwargs: Dict[str, Any]) -> _Result:
+    # Runs in a background process
+    t0 = time.perf_counter()
+    model_output = GameManager.run(model_input, **kwargs)
+    return _Result(model_output, time.perf_counter() - t0)
@@ -0,0 +1,149 @@
+"""
+Run the solver in a pool of worker processes, so async views can await it
+without tying up the event loop. Cheap requests like /api/opener keep getting
+answered while solves are in progress.
+
+The pool has settings.SOLVER_POOL_WORKERS processes. Solves past that wait
+their turn in the executor's queue. It's created on first use, so each
+gunicorn worker gets its own pool after the fork rather than sharing one.
+
+Callers can ask to hear about each turn as the search finishes it. That
+progress comes back from the worker through a pipe, which the event loop
+watches like any other socket.
+
+If settings.SOLVER_SOCKET is set, solves go to the standalone solver service
+instead (see solver_service.py). If the service can't take the request, we
+fall back to the local pool. If it took the request but didn't answer in
+time, the solve counts as turned away for being busy.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import functools
+import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+import threading
+from typing import Any, Callable, Dict, Optional
+from django.conf import settings
+
+from . import admission, metrics
+from .amulet_model import GameManager
+from .amulet_model.game_manager import (
+    ModelInputDict,
+    ModelOutputDict,
+    TurnProgressDict,
+)
+from .solver_service import SolverBusy, SolverClient, SolverUnavailable
+
+
+_LOCK = threading.Lock()
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_CLIENT: Optional[SolverClient] = None
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ProcessPoolExecutor(max_workers=settings.SOLVER_POOL_WORKERS)
+        return _EXECUTOR
+
+
+def reset_executor() -> None:
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _EXECUTOR = None
+
+
+def get_client() -> Optional[SolverClient]:
+    global _CLIENT
+    if not settings.SOLVER_SOCKET:
+        return None
+    with _LOCK:
+        if _CLIENT is None:
+            _CLIENT = SolverClient(
+                settings.SOLVER_SOCKET,
+                timeout=settings.SOLVER_SOCKET_TIMEOUT_SECONDS,
+            )
+        return _CLIENT
+
+
+async def run(
+    model_input: ModelInputDict,
+    on_turn: Optional[Callable[[TurnProgressDict], None]] = None,
+    **kwargs: Any,
+) -> ModelOutputDict:
+    loop = asyncio.get_running_loop()
+    client = get_client()
+    # The service protocol has no progress messages, so on_turn never hears
+    # from it
+    if client is not None:
+        # The client blocks on its socket, so give it a thread
+        solve = functools.partial(client.solve, model_input, **kwargs)
+        try:
+            return await loop.run_in_executor(None, solve)
+        except SolverUnavailable as e:
+            _LOGGER.warning("solver service unavailable, solving locally: %s", e)
+            metrics.increment("amulet_solver_fallbacks_total")
+        except SolverBusy as e:
+            # The service may still be on it, so don't solve it here too
+            _LOGGER.warning("solver service didn't answer in time: %s", e)
+            metrics.increment("amulet_solver_rejected_total", reason="service")
+            raise admission.ServerBusy(str(e)) from e
+    try:
+        if on_turn is None:
+            return await loop.run_in_executor(
+                get_executor(), _run_in_worker, model_input, kwargs
+            )
+        return await _run_with_progress(model_input, kwargs, on_turn)
+    except BrokenProcessPool:
+        # A worker died (probably the OOM killer). Start fresh next time
+        reset_executor()
+        raise
+
+
+async def _run_with_progress(
+    model_input: ModelInputDict,
+    kwargs: Dict[str, Any],
+    on_turn: Callable[[TurnProgressDict], None],
+) -> ModelOutputDict:
+    loop = asyncio.get_running_loop()
+    reader, writer = multiprocessing.Pipe(duplex=False)
+
+    def read_progress() -> None:
+        # Each message is small enough to arrive all at once
+        while reader.poll():
+            on_turn(reader.recv())
+
+    loop.add_reader(reader.fileno(), read_progress)
+    try:
+        return await loop.run_in_executor(
+            get_executor(), _run_in_worker, model_input, kwargs, writer
+        )
+    finally:
+        loop.remove_reader(reader.fileno())
+        # The worker sends everything before it returns, so anything left is
+        # already in the pipe
+        read_progress()
+        reader.close()
+        # Only now, since the executor pickles it for the worker in another
+        # thread
+        writer.close()
+
+
+def _run_in_worker(
+    model_input: ModelInputDict,
+    kwargs: Dict[str, Any],
+    progress: Optional[Connection] = None,
+) -> ModelOutputDict:
+    # Runs in the worker process. Settings come in as arguments, so this
+    # doesn't need Django
+    if progress is not None:
+        kwargs = {**kwargs, "on_turn": progress.send}
+    return GameManager.run(model_input, **kwargs)
@@ -0,0 +1,259 @@
+"""
+The solver as a standalone local service, so web workers and solver capacity
+can be sized separately. Run from app/ with:
+
+    python -m backend.solver_service --socket /tmp/amulet-solver.sock -j 4
+
+The parent process loads the card data and builds the move tables, then
+forks a pool of workers that share them. Each connection carries a single
+request. Workers wait in accept() on the same Unix socket, and a worker
+that's busy solving isn't waiting, so each request goes to an idle worker.
+Past -j requests at once, the rest wait in the listen backlog for the next
+worker to free up. So -j is the number of solves the service runs at once.
+
+Messages in both directions are a 4-byte big-endian length, then that many
+bytes of JSON. A request is {"input": ..., "kwargs": ...}, with the keyword
+arguments for GameManager.run. A response is {"output": ...} or
+{"error": ...}.
+
+SolverClient is the other end. It opens a new connection for each solve
+(cheap, next to the solve itself). If it can't get the request to the
+service, it raises SolverUnavailable, so the caller can fall back to solving
+in-process. Once the service has the request, it may still be working on it
+even if no answer comes back in time. Solving it again locally would double
+the work just when the box is busiest, so that raises SolverBusy instead.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import struct
+from typing import Any, Dict, Optional, Set
+
+from .amulet_model import GameManager
+from .amulet_model.game_manager import ModelInputDict, ModelOutputDict
+from .amulet_model.mana import Mana
+from .amulet_model.move_generator import MoveGenerator
+from .amulet_model.note import Note, NoteType
+
+
+_HEADER = struct.Struct("!I")
+_MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+_BACKLOG = 128
+
+# Don't let a stalled client hold up a worker
+_READ_TIMEOUT_SECONDS = 5.0
+
+
+class SolverUnavailable(Exception):
+    pass
+
+
+class SolverBusy(Exception):
+    pass
+
+
+class SolverServer:
+    def __init__(self, path: str, n_workers: int):
+        self.path = path
+        self.n_workers = n_workers
+        self._listener: Optional[socket.socket] = None
+        self._children: Set[int] = set()
+        self._is_stopping = False
+
+    def serve_forever(self) -> None:
+        self.bind()
+        try:
+            # With no workers, serve from this process. Handy for tests
+            if not self.n_workers:
+                self._run_worker()
+                return
+            warm_up()
+            for _ in range(self.n_workers):
+                self._spawn()
+            signal.signal(signal.SIGTERM, self._stop)
+            signal.signal(signal.SIGINT, self._stop)
+            while self._children:
+                pid, _ = os.wait()
+                self._children.discard(pid)
+                if not self._is_stopping:
+                    # A worker died, probably mid-solve. Replace it
+                    self._spawn()
+        finally:
+            self.close()
+
+    def bind(self) -> None:
+        if self._listener is not None:
+            return
+        # A socket file left over from a crash would make bind fail
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(_BACKLOG)
+        self._listener = listener
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self._children.add(pid)
+            return
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            self._run_worker()
+        finally:
+            os._exit(0)
+
+    def _stop(self, *args: Any) -> None:
+        self._is_stopping = True
+        for pid in self._children:
+            os.kill(pid, signal.SIGTERM)
+
+    def _run_worker(self) -> None:
+        # Only idle workers wait in accept(), so a new request never lands
+        # behind a solve that's already running
+        assert self._listener is not None
+        while True:
+            conn, _ = self._listener.accept()
+            with conn:
+                conn.settimeout(_READ_TIMEOUT_SECONDS)
+                try:
+                    request = receive_message(conn)
+                    send_message(conn, handle_request(request))
+                except (OSError, ValueError):
+                    # Disconnected, or sent us garbage
+                    pass
+
+
+def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        mid = decode_input(request["input"])
+        mod = GameManager.run(mid, **request.get("kwargs", {}))
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    return {"output": encode_output(mod)}
+
+
+def warm_up() -> None:
+    # Load the card data and build the move tables before forking, so the
+    # workers share one copy rather than each building their own
+    MoveGenerator.get_activations((), Mana())
+
+
+class SolverClient:
+    def __init__(self, path: str, timeout: float):
+        self.path = path
+        self.timeout = timeout
+
+    def solve(self, mid: ModelInputDict, **kwargs: Any) -> ModelOutputDict:
+        request = {"input": mid, "kwargs": kwargs}
+        try:
+            conn = self._connect()
+        except OSError as e:
+            # Not running, or restarting
+            raise SolverUnavailable(str(e) or type(e).__name__) from e
+        with conn:
+            try:
+                send_message(conn, request)
+            except OSError as e:
+                raise SolverUnavailable(str(e) or type(e).__name__) from e
+            try:
+                response = receive_message(conn)
+            except (OSError, ValueError) as e:
+                # Too slow, or a worker died mid-solve
+                raise SolverBusy(str(e) or type(e).__name__) from e
+        if "error" in response:
+            raise SolverUnavailable(response["error"])
+        mod = decode_output(response["output"])
+        # Like GameManager.run, the caller expects its input to be updated
+        mid["opener"]["library"][:] = mod["opener"]["library"]
+        mid["stats"].update(mod["stats"])
+        return mod
+
+    def _connect(self) -> socket.socket:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(self.timeout)
+        try:
+            conn.connect(self.path)
+        except OSError:
+            conn.close()
+            raise
+        return conn
+
+
+def send_message(conn: socket.socket, message: Dict[str, Any]) -> None:
+    payload = json.dumps(message, separators=(",", ":")).encode()
+    conn.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def receive_message(conn: socket.socket) -> Dict[str, Any]:
+    (size,) = _HEADER.unpack(_receive_exactly(conn, _HEADER.size))
+    if size > _MAX_MESSAGE_BYTES:
+        raise ValueError(f"message too big: {size} bytes")
+    return json.loads(_receive_exactly(conn, size))
+
+
+def _receive_exactly(conn: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = conn.recv(min(size, 65536))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def decode_input(data: Dict[str, Any]) -> ModelInputDict:
+    # JSON object keys are always strings
+    return {
+        "opener": data["opener"],
+        "stats": {int(k): v for k, v in data["stats"].items()},
+    }
+
+
+def encode_output(mod: ModelOutputDict) -> Dict[str, Any]:
+    data: Dict[str, Any] = dict(mod)
+    data["summary"] = {
+        "notes": [[n.text, n.type.value] for n in mod["summary"]["notes"]],
+        "turn": mod["summary"]["turn"],
+    }
+    return data
+
+
+def decode_output(data: Dict[str, Any]) -> ModelOutputDict:
+    mod: ModelOutputDict = {
+        "opener": data["opener"],
+        "summary": {
+            "notes": [Note(text, NoteType(t)) for text, t in data["summary"]["notes"]],
+            "turn": data["summary"]["turn"],
+        },
+        "stats": {int(k): v for k, v in data["stats"].items()},
+        "search": data["search"],
+    }
+    if "telemetry" in data:
+        mod["telemetry"] = data["telemetry"]
+    return mod
+
+
+def main():
+    parser = argparse.ArgumentParser(description="solver service")
+    parser.add_argument("--socket", required=True, help="path to the Unix socket")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    print(f"serving on {args.socket} with {args.workers} workers")
+    SolverServer(args.socket, args.workers).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Django settings for the backend tests. The real ones in core/settings.py want
+a secret key and a deploy config, and the tests don't need either.
+"""
+
+import tempfile
+from django.conf import settings
+
+
+if not settings.configured:
+    settings.configure(
+        SECRET_KEY="not a secret",
+        SOLVER_MAX_FRONTIER_BYTES=64 * 1024 * 1024,
+        SOLVER_MAX_EXPANSIONS=10000,
+        SOLVER_MAX_WAIT_SECONDS=10,
+        SOLVER_BEAM_WIDTH=None,
+        SOLVER_POOL_WORKERS=1,
+        SOLVER_MAX_SAMPLES=50,
+        SOLVER_TELEMETRY=False,
+        SOLVER_SOCKET=None,
+        PRESOLVE_WORKERS=0,
+        EVALUATE_WORKERS=1,
+        EVALUATE_MAX_BYTES=64 * 1024,
+        EVALUATE_MAX_OPENERS=100,
+        EVALUATE_MAX_SAMPLES=50,
+        EVALUATE_MAX_TOTAL_SAMPLES=1000,
+        EVALUATE_MAX_SECONDS=30,
+        METRICS_DIR=tempfile.mkdtemp(),
+        METRICS_FLUSH_SECONDS=5,
+    )
@@ -0,0 +1,140 @@
+"""
+To be run with pytest
+"""
+
+import asyncio
+import pytest
+
+from ..admission import AdmissionController, ServerBusy
+
+
+def get_controller(max_concurrent=1, max_queue=2, queue_timeout=1.0):
+    return AdmissionController(
+        max_concurrent=max_concurrent,
+        max_queue=max_queue,
+        queue_timeout=queue_timeout,
+    )
+
+
+async def wait_in_line(controller, depth):
+    # Let queued acquires get in line
+    while controller.queue_depth < depth:
+        await asyncio.sleep(0)
+
+
+def test_admit():
+    async def run():
+        controller = get_controller(max_concurrent=2)
+        async with controller.admit() as ticket:
+            assert ticket.budget_scale == 1
+            async with controller.admit():
+                assert controller.n_active == 2
+            assert controller.n_active == 1
+        assert controller.n_active == 0
+
+    asyncio.run(run())
+
+
+def test_queue_full():
+    async def run():
+        controller = get_controller(max_queue=0)
+        await controller.acquire()
+        with pytest.raises(ServerBusy):
+            await controller.acquire()
+        assert controller.n_active == 1
+        controller.release()
+        assert controller.n_active == 0
+
+    asyncio.run(run())
+
+
+def test_deadline():
+    async def run():
+        controller = get_controller(queue_timeout=0.01)
+        await controller.acquire()
+        with pytest.raises(ServerBusy):
+            await controller.acquire()
+        assert controller.queue_depth == 0
+        controller.release()
+        assert controller.n_active == 0
+
+    asyncio.run(run())
+
+
+def test_hand_off():
+    async def run():
+        controller = get_controller()
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await wait_in_line(controller, 1)
+        controller.release()
+        ticket = await waiter
+        # The slot went straight to the waiter, and the line cost it some budget
+        assert controller.n_active == 1
+        assert ticket.budget_scale < 1
+        controller.release()
+        assert controller.n_active == 0
+
+    asyncio.run(run())
+
+
+def test_cancel_in_line():
+    async def run():
+        controller = get_controller()
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await wait_in_line(controller, 1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.queue_depth == 0
+        controller.release()
+        assert controller.n_active == 0
+        # The slot isn't lost
+        async with controller.admit():
+            assert controller.n_active == 1
+
+    asyncio.run(run())
+
+
+def test_cancel_after_hand_off():
+    async def run():
+        controller = get_controller()
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await wait_in_line(controller, 1)
+        # The waiter is cancelled, but the slot is handed to it before it wakes
+        # up to notice. It should pass the slot along
+        waiter.cancel()
+        controller.release()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.n_active == 0
+
+    asyncio.run(run())
+
+
+def test_hold_until_done():
+    async def run():
+        controller = get_controller()
+        work = asyncio.get_running_loop().create_future()
+
+        async def wait_for_work():
+            admitted = controller.admit()
+            async with admitted:
+                admitted.hold_until_done(work)
+                await asyncio.shield(work)
+
+        waiter = asyncio.create_task(wait_for_work())
+        while not controller.n_active:
+            await asyncio.sleep(0)
+        # We stop waiting, but the work is still going
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.n_active == 1
+        work.set_result(None)
+        await asyncio.sleep(0)
+        assert controller.n_active == 0
+
+    asyncio.run(run())
@@ -0,0 +1,149 @@
+"""
+To be run with pytest
+"""
+
+import asyncio
+from concurrent.futures import Future
+from django.test import override_settings
+import pytest
+
+from .. import batch
+
+
+HAND = ["Forest", "Amulet of Vigor", "Primeval Titan", "Explore"]
+
+
+def get_data(**opener):
+    return {"openers": [{"hand": HAND, "on_the_play": True, **opener}]}
+
+
+def test_parse_request():
+    data = get_data(samples=3)
+    data["lines"] = True
+    request = batch.parse_request(data)
+    assert request.openers == [batch.Opener(tuple(HAND), True, 3)]
+    assert request.deck == "default"
+    assert request.lines
+
+
+def test_parse_defaults():
+    request = batch.parse_request(get_data())
+    assert request.openers[0].samples == 1
+    assert not request.lines
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        None,
+        [],
+        {},
+        {"openers": "Forest"},
+        {"openers": []},
+        {"openers": ["Forest"]},
+        {"openers": [{"hand": HAND, "on_the_play": True}], "deck": 5},
+        {"openers": [{"hand": HAND, "on_the_play": True}], "deck": "nope"},
+        {"openers": [{"hand": HAND, "on_the_play": True}], "deck": "../deck-list"},
+    ],
+)
+def test_bad_request(data):
+    with pytest.raises(ValueError):
+        batch.parse_request(data)
+
+
+@pytest.mark.parametrize(
+    "opener",
+    [
+        {"hand": "Forest"},
+        {"hand": []},
+        {"hand": ["Forest"] * 8},
+        {"hand": ["Forest", 5]},
+        # Not in the deck, or not enough copies of it
+        {"hand": ["Black Lotus"]},
+        {"hand": ["Forest"] * 7},
+        {"hand": ["Bojuka Bog", "Bojuka Bog"]},
+        {"on_the_play": "true"},
+        {"on_the_play": None},
+        {"samples": "3"},
+        {"samples": 2.5},
+        {"samples": True},
+        {"samples": 0},
+        {"samples": 51},
+    ],
+)
+def test_bad_opener(opener):
+    with pytest.raises(ValueError):
+        batch.parse_request(get_data(**opener))
+
+
+def test_six_forests():
+    request = batch.parse_request(get_data(hand=["Forest"] * 6))
+    assert request.openers[0].hand == ("Forest",) * 6
+
+
+@override_settings(EVALUATE_MAX_OPENERS=2)
+def test_too_many_openers():
+    data = {"openers": get_data()["openers"] * 3}
+    with pytest.raises(ValueError):
+        batch.parse_request(data)
+
+
+@override_settings(EVALUATE_MAX_TOTAL_SAMPLES=10)
+def test_total_samples():
+    with pytest.raises(ValueError):
+        batch.parse_request(
+            {
+                "openers": [
+                    {"hand": HAND, "on_the_play": True, "samples": 6},
+                    {"hand": HAND, "on_the_play": False, "samples": 6},
+                ]
+            }
+        )
+    # The same hand in another order is the same opener, so it's only played
+    # out once, and only counts once
+    request = batch.parse_request(
+        {
+            "openers": [
+                {"hand": HAND, "on_the_play": True, "samples": 6},
+                {"hand": HAND[::-1], "on_the_play": True, "samples": 8},
+            ]
+        }
+    )
+    assert len(request.openers) == 2
+
+
+def test_format_result():
+    opener = batch.Opener(tuple(HAND), True, 3)
+    result = batch._format_result(opener, None, lines=True)
+    assert result["samples"] == 0
+    assert result["kill_turns"] == {"1": 0, "2": 0, "3": 0, "4": 0, "none": 0}
+    assert not result["complete"]
+    assert result["line"] is None
+
+
+class StuckExecutor:
+    # Its openers start right away and keep going until the test says so
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, *args):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self.futures.append(future)
+        return future
+
+
+@override_settings(EVALUATE_MAX_SECONDS=0)
+def test_busy_until_done(monkeypatch):
+    executor = StuckExecutor()
+    monkeypatch.setattr(batch, "get_executor", lambda: executor)
+    monkeypatch.setattr(batch, "_GRACE_SECONDS", 0)
+    request = batch.parse_request(get_data())
+    results = asyncio.run(batch.evaluate(request))
+    assert not results[0]["complete"]
+    # The opener is still being played out, so the batch is still running
+    with pytest.raises(batch.ServerBusy):
+        asyncio.run(batch.evaluate(request))
+    executor.futures[0].set_result(None)
+    assert batch._BATCH_LOCK.acquire(blocking=False)
+    batch._BATCH_LOCK.release()
@@ -0,0 +1,19 @@
+"""
+To be run with pytest
+"""
+
+import random
+
+from .. import loadtest
+from ..amulet_model import GameManager, HtmxHelper
+from ..amulet_model.deck import load_deck_list
+
+
+def test_play_payload():
+    def fetch(path):
+        mid = GameManager.get_model_input_from_deck_list(load_deck_list())
+        return 200, HtmxHelper.format_input(mid)
+
+    # The teaser's link asks for many shuffles. Plays should be just one
+    payloads = loadtest.PayloadPool(fetch, random.Random(0))
+    assert list(payloads.choose()) == ["token"]
@@ -0,0 +1,64 @@
+"""
+To be run with pytest
+"""
+
+import json
+import os
+import random
+from django.test import override_settings
+import pytest
+
+from .. import metrics
+from ..amulet_model.deck import load_deck_list
+from ..amulet_model.game_manager import GameManager
+
+
+@pytest.mark.parametrize(
+    "kwargs, reason",
+    [
+        ({"max_expansions": 5}, "expansions"),
+        ({"max_frontier_states": 2}, "memory"),
+        ({"max_wait_seconds": 0}, "timed_out"),
+    ],
+)
+def test_incomplete(kwargs, reason):
+    random.seed(0)
+    mid = GameManager.get_model_input_from_deck_list(load_deck_list())
+    model_output = GameManager.run(mid, **kwargs)
+    assert not model_output["search"]["complete"]
+    before = metrics._METRICS.data["counters"].get("amulet_solver_incomplete_total")
+    before = dict(before or {})
+    metrics.observe_solve(model_output, 0.1)
+    after = metrics._METRICS.data["counters"]["amulet_solver_incomplete_total"]
+    key = f'reason="{reason}"'
+    assert after[key] == before.get(key, 0) + 1
+
+
+def write_file(path, count):
+    data = {
+        "counters": {"amulet_evaluate_samples_total": {"": count}},
+        "gauges": {"amulet_solver_active": {"": 1}},
+        "histograms": {},
+    }
+    path.write_text(json.dumps(data))
+
+
+def test_collect(tmp_path):
+    with override_settings(METRICS_DIR=str(tmp_path)):
+        before = metrics.collect()
+        n_samples = before["counters"].get("amulet_evaluate_samples_total", {})
+        n_samples = n_samples.get("", 0)
+        # One from a process that's gone, one from an unrelated process that
+        # happens to have a worker's old PID, and one from before start times
+        write_file(tmp_path / "metrics-999999999-123.json", 1)
+        write_file(tmp_path / f"metrics-{os.getpid()}-0.json", 10)
+        write_file(tmp_path / "metrics-5.json", 100)
+        for _ in range(2):
+            total = metrics.collect()
+            # Retired, but still counted, and only once
+            counter = total["counters"]["amulet_evaluate_samples_total"]
+            assert counter[""] == n_samples + 111
+            # Their gauges are stale, though
+            assert total["gauges"] == before["gauges"]
+        names = sorted(p.name for p in tmp_path.glob("*.json"))
+        assert names == [f"metrics-{metrics._METRICS.key}.json", "retired.json"]
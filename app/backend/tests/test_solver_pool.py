@@ -0,0 +1,25 @@
+"""
+To be run with pytest
+"""
+
+import asyncio
+import random
+
+from .. import solver_pool
+from ..amulet_model.deck import load_deck_list
+from ..amulet_model.game_manager import GameManager
+
+
+def test_progress():
+    random.seed(0)
+    mid = GameManager.get_model_input_from_deck_list(load_deck_list())
+    turns = []
+    try:
+        mod = asyncio.run(solver_pool.run(mid, on_turn=turns.append))
+    finally:
+        solver_pool.reset_executor()
+    # Every turn searched gets reported, in order, before the answer is back
+    assert turns
+    assert [t["turn"] for t in turns] == sorted(t["turn"] for t in turns)
+    assert turns[-1]["turn"] <= 3
+    assert sum(mod["stats"].values()) == 1
@@ -0,0 +1,150 @@
+"""
+To be run with pytest
+"""
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import pytest
+
+from .. import solver_pool, solver_service
+from ..amulet_model.deck import load_deck_list
+from ..amulet_model.game_manager import GameManager
+from ..amulet_model.note import Note
+from ..admission import ServerBusy
+from ..solver_service import SolverBusy, SolverClient, SolverServer, SolverUnavailable
+
+
+def get_model_input():
+    return GameManager.get_model_input_from_deck_list(load_deck_list())
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / "solver.sock")
+
+
+@pytest.fixture
+def start_server(socket_path):
+    processes = []
+
+    def start(n_workers):
+        server = SolverServer(socket_path, n_workers)
+        # Bind before forking, so the socket is there as soon as we return
+        server.bind()
+        process = multiprocessing.get_context("fork").Process(
+            target=server.serve_forever
+        )
+        process.start()
+        server._listener.close()
+        processes.append(process)
+
+    yield start
+    for process in processes:
+        process.terminate()
+        process.join()
+
+
+def test_messages():
+    a, b = socket.socketpair()
+    with a, b:
+        solver_service.send_message(a, {"x": [1, 2, 3]})
+        assert solver_service.receive_message(b) == {"x": [1, 2, 3]}
+
+
+def test_message_too_big():
+    a, b = socket.socketpair()
+    with a, b:
+        a.sendall(solver_service._HEADER.pack(solver_service._MAX_MESSAGE_BYTES + 1))
+        with pytest.raises(ValueError):
+            solver_service.receive_message(b)
+
+
+def test_solve(start_server, socket_path):
+    start_server(0)
+    mid = get_model_input()
+    mod = SolverClient(socket_path, timeout=10).solve(mid, max_expansions=100)
+    assert all(isinstance(n, Note) for n in mod["summary"]["notes"])
+    assert sum(mod["stats"].values()) == 1
+    # Like GameManager.run, the input gets updated too
+    assert mid["stats"] == mod["stats"]
+    assert mid["opener"]["library"] == mod["opener"]["library"]
+
+
+def test_error(start_server, socket_path):
+    start_server(0)
+    mid = get_model_input()
+    with pytest.raises(SolverUnavailable, match="TypeError"):
+        SolverClient(socket_path, timeout=10).solve(mid, no_such_argument=1)
+
+
+def test_not_running(socket_path):
+    with pytest.raises(SolverUnavailable):
+        SolverClient(socket_path, timeout=1).solve(get_model_input())
+
+
+def test_timeout(monkeypatch, start_server, socket_path):
+    def handle_request(request):
+        time.sleep(1)
+        return {"error": "too late"}
+
+    monkeypatch.setattr(solver_service, "handle_request", handle_request)
+    start_server(0)
+    # It got the request, so we shouldn't go and solve it again ourselves
+    with pytest.raises(SolverBusy, match="timed out"):
+        SolverClient(socket_path, timeout=0.1).solve(get_model_input())
+
+
+def test_idle_worker(monkeypatch, start_server, socket_path):
+    # Answer with the worker's PID, and take long enough that both requests
+    # are in flight at once
+    def handle_request(request):
+        time.sleep(0.5)
+        return {"error": str(os.getpid())}
+
+    monkeypatch.setattr(solver_service, "handle_request", handle_request)
+    start_server(2)
+    client = SolverClient(socket_path, timeout=10)
+    pids = []
+
+    def solve():
+        with pytest.raises(SolverUnavailable) as e:
+            client.solve(get_model_input())
+        pids.append(str(e.value))
+
+    threads = [threading.Thread(target=solve) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # A busy worker doesn't take new requests, so the second one went to the
+    # other worker rather than waiting behind the first
+    assert len(set(pids)) == 2
+
+
+def test_fallback(monkeypatch, socket_path):
+    # Nothing is listening, so the solve should happen in the local pool
+    client = SolverClient(socket_path, timeout=1)
+    monkeypatch.setattr(solver_pool, "get_client", lambda: client)
+    try:
+        mod = asyncio.run(solver_pool.run(get_model_input(), max_expansions=100))
+    finally:
+        solver_pool.reset_executor()
+    assert sum(mod["stats"].values()) == 1
+
+
+def test_no_fallback_when_busy(monkeypatch):
+    class SlowClient:
+        def solve(self, mid, **kwargs):
+            raise SolverBusy("timed out")
+
+    def get_executor():
+        raise AssertionError("solved locally too")
+
+    monkeypatch.setattr(solver_pool, "get_client", lambda: SlowClient())
+    monkeypatch.setattr(solver_pool, "get_executor", get_executor)
+    with pytest.raises(ServerBusy):
+        asyncio.run(solver_pool.run(get_model_input()))
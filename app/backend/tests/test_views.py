@@ -0,0 +1,82 @@
+"""
+To be run with pytest
+"""
+
+import asyncio
+import json
+from django.test import RequestFactory, override_settings
+import pytest
+
+from .. import admission, solver_pool, views
+from ..amulet_model import HtmxHelper
+from ..amulet_model.deck import load_deck_list
+from ..amulet_model.game_manager import GameManager
+
+
+def test_hang_up_keeps_slot(monkeypatch):
+    async def run():
+        controller = admission.AdmissionController(1, 1, 1.0)
+        monkeypatch.setattr(admission, "get_controller", lambda: controller)
+        done = asyncio.Event()
+
+        async def fake_run(model_input, **kwargs):
+            # Stands in for a solve in another process, which won't stop
+            # just because the request went away
+            await asyncio.shield(done.wait())
+            return {}
+
+        monkeypatch.setattr(solver_pool, "run", fake_run)
+        mid = GameManager.get_model_input_from_deck_list(load_deck_list())
+        request = asyncio.create_task(views._run_solver(mid))
+        while not controller.n_active:
+            await asyncio.sleep(0)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        # The solve is still using a CPU, so it still counts
+        assert controller.n_active == 1
+        done.set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert controller.n_active == 0
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "content_length, body, status",
+    [
+        ("nope", b"{}", 400),
+        (str(64 * 1024 + 1), b"{}", 413),
+        # Chunked, so no Content-Length, but still too big
+        (None, b" " * (64 * 1024 + 1), 413),
+        (None, b"not json", 400),
+        (None, b"[" * 50000, 400),
+    ],
+)
+def test_evaluate_body(content_length, body, status):
+    request = RequestFactory().post(
+        "/api/evaluate", body, content_type="application/json"
+    )
+    del request.META["CONTENT_LENGTH"]
+    if content_length is not None:
+        request.META["CONTENT_LENGTH"] = content_length
+    response = asyncio.run(views.evaluate(request))
+    assert response.status_code == status
+
+
+@pytest.mark.parametrize("debug", [False, True])
+def test_telemetry_header(monkeypatch, debug):
+    seen = {}
+
+    async def fake_run_solver(model_input, telemetry=False, samples=1):
+        seen["telemetry"] = telemetry
+        raise admission.ServerBusy("just checking")
+
+    monkeypatch.setattr(views, "_run_solver", fake_run_solver)
+    mid = GameManager.get_model_input_from_deck_list(load_deck_list())
+    payload = json.loads(HtmxHelper._serialize_payload(mid))
+    request = RequestFactory().get("/api/play", payload, HTTP_X_SOLVER_TELEMETRY="1")
+    with override_settings(DEBUG=debug, SOLVER_TELEMETRY=False):
+        asyncio.run(views.play_it_out(request))
+    assert seen["telemetry"] == debug
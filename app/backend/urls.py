@@ -6,5 +6,8 @@ urlpatterns = [
     path("e2e", views.e2e),
     path("opener", views.opener),
     path("play", views.play_it_out),
+    path("play/stream", views.play_stream),
     path("about", views.about),
+    path("evaluate", views.evaluate),
+    path("metrics", views.metrics_view),
 ]
@@ -1,35 +1,308 @@
+import asyncio
+import hashlib
+import json
+import os
 from pathlib import Path
-from typing import Generator, List, Tuple
-from django.http import HttpRequest, HttpResponse
+import re
+import time
+from typing import (
+    AsyncGenerator,
+    Callable,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+from django.conf import settings
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 import markdown
 
-from .amulet_model import GameManager, HtmxHelper
+from . import admission, batch, metrics, presolve, solver_pool
+from .amulet_model import GameManager, HtmxHelper, opener_token
 from .amulet_model.card import Card
+from .amulet_model.deck import DEFAULT_DECK, get_deck, get_deck_path, load_deck_list
+from .amulet_model.game_manager import (
+    ModelInputDict,
+    ModelOutputDict,
+    TurnProgressDict,
+)
 
 
-def e2e(request: HttpRequest) -> HttpResponse:
-    deck_list = load_deck_list()
-    model_input = GameManager.get_model_input_from_deck_list(deck_list)
-    model_output = GameManager.run(model_input)
+# Sign the opener tokens on the play buttons, so we can trust what comes back
+opener_token.set_secret(settings.SECRET_KEY)
+
+
+@metrics.instrument
+async def e2e(request: HttpRequest) -> HttpResponse:
+    model_input = GameManager.get_model_input_from_deck_list(load_deck_list())
+    try:
+        model_output = await _run_solver(model_input)
+    except admission.ServerBusy:
+        return _busy_response(HtmxHelper.format_busy(model_input))
     return HttpResponse(HtmxHelper.format_output(model_output))
 
 
-def opener(request: HttpRequest) -> HttpResponse:
-    deck_list = load_deck_list()
-    model_input = GameManager.get_model_input_from_deck_list(deck_list)
+@metrics.instrument
+async def opener(request: HttpRequest) -> HttpResponse:
+    # The deck is already in memory, so this is just a shuffle
+    model_input = GameManager.get_model_input_from_deck_list(load_deck_list())
+    # Start on the solve while the user looks at the hand
+    presolve.schedule(model_input)
     return HttpResponse(HtmxHelper.format_input(model_input))
 
 
-def play_it_out(request: HttpRequest) -> HttpResponse:
-    model_input = HtmxHelper.parse_payload(request.GET)
-    model_output = GameManager.run(model_input)
-    return HttpResponse(HtmxHelper.format_output(model_output))
+@metrics.instrument
+async def play_it_out(request: HttpRequest) -> HttpResponse:
+    try:
+        model_input = HtmxHelper.parse_payload(request.GET)
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest("bad opener payload")
+    try:
+        samples = _get_samples(request)
+    except ValueError:
+        return HttpResponseBadRequest("bad sample count")
+    # Telemetry skips the speculative solves and shows how the search works
+    # inside, so clients only get to ask for it in development
+    asked = settings.DEBUG and "X-Solver-Telemetry" in request.headers
+    telemetry = settings.SOLVER_TELEMETRY or asked
+    # Speculative solves are one shuffle each, and don't collect telemetry
+    model_output = None
+    if samples == 1 and not telemetry:
+        model_output = await presolve.take(model_input)
+    if model_output is None:
+        try:
+            model_output = await _run_solver(
+                model_input, telemetry=telemetry, samples=samples
+            )
+        except admission.ServerBusy:
+            return _busy_response(HtmxHelper.format_busy_summary())
+    presolve.schedule_next(model_output)
+    # Only the summary and stats change, so leave the rest of the page be
+    response = HttpResponse(HtmxHelper.format_play_output(model_output))
+    if telemetry:
+        response["X-Solver-Telemetry"] = json.dumps(
+            {"search": model_output["search"], **model_output["telemetry"]},
+            separators=(",", ":"),
+        )
+    return response
+
+
+@metrics.instrument
+async def play_stream(request: HttpRequest) -> HttpResponse:
+    # Like /api/play, but as server-sent events. A placeholder summary goes
+    # out right away, then a line for each turn searched, then the summary
+    try:
+        model_input = HtmxHelper.parse_payload(request.GET)
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest("bad opener payload")
+    response = StreamingHttpResponse(
+        _stream_play(model_input), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Otherwise nginx holds on to the events until the end
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _stream_play(model_input: ModelInputDict) -> AsyncGenerator[str, None]:
+    yield _sse("start", HtmxHelper.format_searching())
+    # A speculative solve has no progress to report, so it's straight to done
+    model_output = await presolve.take(model_input)
+    if model_output is None:
+        progress: "asyncio.Queue[Optional[TurnProgressDict]]" = asyncio.Queue()
+        solve = asyncio.ensure_future(
+            _run_solver(model_input, on_turn=progress.put_nowait)
+        )
+        # Wake up the loop below when the solve is over, one way or another
+        solve.add_done_callback(lambda _: progress.put_nowait(None))
+        try:
+            while True:
+                turn_progress = await progress.get()
+                if turn_progress is None:
+                    break
+                yield _sse("turn", HtmxHelper.format_progress(turn_progress))
+            try:
+                model_output = solve.result()
+            except admission.ServerBusy:
+                yield _sse("done", HtmxHelper.format_busy_summary())
+                return
+        finally:
+            # If the client hangs up, stop waiting. The solve itself runs to
+            # the end of its budget in another process, and keeps its slot
+            # until then
+            solve.cancel()
+    presolve.schedule_next(model_output)
+    yield _sse("done", HtmxHelper.format_play_output(model_output))
+
+
+@metrics.instrument
+async def evaluate(request: HttpRequest) -> HttpResponse:
+    # Openers in, kill turns out, as JSON. See batch.py
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    try:
+        content_length = int(request.headers.get("Content-Length") or 0)
+    except ValueError:
+        return JsonResponse({"error": "bad Content-Length"}, status=400)
+    # Turn away anything that says it's too big before reading it. A chunked
+    # body doesn't say, so read one byte past the cap to find out
+    too_big = JsonResponse({"error": "request is too big"}, status=413)
+    if content_length > settings.EVALUATE_MAX_BYTES:
+        return too_big
+    body = request.read(settings.EVALUATE_MAX_BYTES + 1)
+    if len(body) > settings.EVALUATE_MAX_BYTES:
+        return too_big
+    try:
+        batch_request = batch.parse_request(json.loads(body))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except RecursionError:
+        # Something like [[[[...]]]] gets past the size cap, but the decoder
+        # can't go that deep
+        return JsonResponse({"error": "JSON is nested too deeply"}, status=400)
+    t0 = time.perf_counter()
+    try:
+        results = await batch.evaluate(batch_request)
+    except admission.ServerBusy as e:
+        response = JsonResponse({"error": str(e)}, status=503)
+        response["Retry-After"] = "5"
+        return response
+    return JsonResponse(
+        {"results": results, "seconds": round(time.perf_counter() - t0, 3)}
+    )
+
+
+# Other tools post to this without a CSRF token. Django's csrf_exempt doesn't
+# know about async views yet, so mark it by hand
+evaluate.csrf_exempt = True
+
+
+def _get_samples(request: HttpRequest) -> int:
+    samples = int(request.GET.get("samples", 1))
+    if not 1 <= samples <= settings.SOLVER_MAX_SAMPLES:
+        raise ValueError(f"sample count out of range: {samples}")
+    return samples
+
+
+def _sse(event: str, html: str) -> str:
+    data = "".join(f"data: {line}\n" for line in html.splitlines())
+    return f"event: {event}\n{data}\n"
+
+
+async def _run_solver(
+    model_input: ModelInputDict,
+    telemetry: bool = False,
+    on_turn: Optional[Callable[[TurnProgressDict], None]] = None,
+    samples: int = 1,
+) -> ModelOutputDict:
+    # The solver hogs the CPU, so run it in another process and keep the event
+    # loop free for cheap requests
+    admitted = admission.get_controller().admit()
+    async with admitted as ticket:
+        t0 = time.perf_counter()
+        solve = asyncio.ensure_future(
+            solver_pool.run(
+                model_input,
+                on_turn=on_turn,
+                max_wait_seconds=_scale(settings.SOLVER_MAX_WAIT_SECONDS, ticket),
+                max_frontier_bytes=settings.SOLVER_MAX_FRONTIER_BYTES,
+                max_expansions=_scale(settings.SOLVER_MAX_EXPANSIONS, ticket),
+                beam_width=settings.SOLVER_BEAM_WIDTH,
+                telemetry=telemetry,
+                samples=samples,
+            )
+        )
+        # If we stop waiting (the client hung up), the solve still runs to the
+        # end of its budget in another process. It keeps its slot until then,
+        # so the limit counts what's really running
+        admitted.hold_until_done(solve)
+        model_output = await asyncio.shield(solve)
+    metrics.observe_solve(model_output, time.perf_counter() - t0)
+    return model_output
+
+
+Number = TypeVar("Number", int, float)
+
+
+def _scale(limit: Optional[Number], ticket: admission.Ticket) -> Optional[Number]:
+    if limit is None or ticket.budget_scale == 1:
+        return limit
+    return type(limit)(max(1, limit * ticket.budget_scale))
+
+
+def _busy_response(content: str) -> HttpResponse:
+    response = HttpResponse(content)
+    response["Retry-After"] = "1"
+    return response
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    content = metrics.render(metrics.collect())
+    return HttpResponse(content, content_type="text/plain; version=0.0.4")
 
 
 _APP_DIR = Path(__file__).resolve().parent.parent
 
+# Everything that goes into the about page
+_ABOUT_SOURCES = [
+    f"{_APP_DIR}/assets/about.md",
+    get_deck_path(DEFAULT_DECK),
+    f"{_APP_DIR}/assets/card-data.yaml",
+]
+
+_AUTOCARD_PATTERN = re.compile(r"\[\[(.*?)\]\]")
+
+
+class _AboutPage(NamedTuple):
+    mtimes: Tuple[float, ...]
+    content: str
+    etag: str
+    last_modified: int
+
+
+_ABOUT_PAGE: Optional[_AboutPage] = None
 
-def about(request: HttpRequest) -> HttpResponse:
+
+@metrics.instrument
+async def about(request: HttpRequest) -> HttpResponse:
+    page = _get_about_page()
+    response = HttpResponse(page.content)
+    response["ETag"] = page.etag
+    response["Last-Modified"] = http_date(page.last_modified)
+    # Let the browser keep a copy, but check back in case it changed
+    response["Cache-Control"] = "no-cache"
+    return get_conditional_response(
+        request, etag=page.etag, last_modified=page.last_modified, response=response
+    )
+
+
+def _get_about_page() -> _AboutPage:
+    # The page only changes when one of its sources does, so render it once
+    # and hang on to it. A stat per file is much cheaper than a render
+    global _ABOUT_PAGE
+    mtimes = tuple(os.stat(path).st_mtime for path in _ABOUT_SOURCES)
+    if _ABOUT_PAGE is None or _ABOUT_PAGE.mtimes != mtimes:
+        content = _render_about()
+        digest = hashlib.sha256(content.encode()).hexdigest()[:16]
+        _ABOUT_PAGE = _AboutPage(
+            mtimes=mtimes,
+            content=content,
+            etag=f'"{digest}"',
+            last_modified=int(max(mtimes)),
+        )
+    return _ABOUT_PAGE
+
+
+def _render_about() -> str:
     with open(f"{_APP_DIR}/assets/about.md") as handle:
         content = handle.read()
 
@@ -37,7 +310,7 @@ def about(request: HttpRequest) -> HttpResponse:
     html_content = _handle_autocard_macros(html_content)
 
     lands, nonlands = [], []
-    for n, card_name in load_deck_list_counts():
+    for n, card_name in get_deck().counts:
         if Card(card_name).is_land:
             lands.append([card_name, n])
         else:
@@ -53,37 +326,17 @@ def about(request: HttpRequest) -> HttpResponse:
         decklist += "</ul>"
     decklist += "</div>"
 
-    html_content = html_content.replace("$DECKLIST", decklist)
-
-    return HttpResponse(html_content)
+    return html_content.replace("$DECKLIST", decklist)
 
 
 def _handle_autocard_macros(text):
-    while "[[" in text:
-        text = _handle_autocard_macro(text)
-    return text
+    # One pass over the text, rather than splitting it again for each macro
+    return _AUTOCARD_PATTERN.sub(_handle_autocard_macro, text)
 
 
-def _handle_autocard_macro(text):
-    before, card_and_after = text.split("[[", 1)
-    card_name, after = card_and_after.split("]]", 1)
+def _handle_autocard_macro(match):
+    card_name = match.group(1)
     display = None
     if "|" in card_name:
         card_name, display = card_name.split("|", 1)
-    return before + HtmxHelper.card_name(card_name, display) + after
-
-
-def load_deck_list() -> List[str]:
-    deck_list = []
-    for n, card_name in load_deck_list_counts():
-        deck_list += [card_name] * int(n)
-    return deck_list
-
-
-def load_deck_list_counts() -> Generator[Tuple[str, str], None, None]:
-    ret = []
-    with open(f"{_APP_DIR}/assets/deck-list.txt") as handle:
-        for line in handle:
-            if line.startswith("#") or not line.strip():
-                continue
-            yield tuple(line.rstrip().split(None, 1))
+    return HtmxHelper.card_name(card_name, display)
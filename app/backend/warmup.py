@@ -0,0 +1,47 @@
+"""
+Get a process ready to serve before the first request shows up.
+
+Loads the card data, the decks, and the move tables, fills the rendering
+caches, renders the about page, imports the views behind every URL, and
+plays out a few throwaway hands so the solver's own caches aren't empty.
+
+gunicorn.conf.py runs this once in the master, before it forks the workers.
+Each worker starts out warm, and shares all of this with the master
+copy-on-write rather than building its own copy.
+"""
+
+import logging
+import time
+from django.conf import settings
+from django.urls import get_resolver
+
+from . import views
+from .amulet_model import GameManager, HtmxHelper, opener_token
+from .amulet_model.deck import get_deck, get_deck_names, load_deck_list
+
+
+_SOLVES = 3
+_SOLVE_SECONDS = 1
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def warm_up() -> None:
+    t0 = time.perf_counter()
+    # Loading the decks checks them against the card data, which loads that
+    for name in get_deck_names():
+        get_deck(name)
+    HtmxHelper.warm_up()
+    views._get_about_page()
+    # Resolvers import their views the first time they're used
+    for urlconf in [settings.ROOT_URLCONF, "core.api_urls"]:
+        get_resolver(urlconf).url_patterns
+    # Go straight to the model, not the solver pool. The master shouldn't
+    # start worker processes for the workers to inherit
+    for _ in range(_SOLVES):
+        model_input = GameManager.get_model_input_from_deck_list(load_deck_list())
+        HtmxHelper.format_input(model_input)
+        opener_token.decode(opener_token.encode(model_input))
+        model_output = GameManager.run(model_input, max_wait_seconds=_SOLVE_SECONDS)
+        HtmxHelper.format_play_output(model_output)
+    _LOGGER.info("warmed up in %.2fs", time.perf_counter() - t0)
@@ -0,0 +1,10 @@
+"""
+URL configuration for the lean /api/ path. Same routes as under /api/ in
+core/urls.py, without the frontend or the admin.
+"""
+
+from django.urls import include, path
+
+urlpatterns = [
+    path("api/", include("backend.urls")),
+]
@@ -9,8 +9,56 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
-application = get_asgi_application()
+
+class ApiHandler(ASGIHandler):
+    """
+    Serves /api/ with settings.API_MIDDLEWARE instead of the full list. The
+    solver and opener endpoints don't need sessions, auth, CSRF, and so on,
+    and never touch the database.
+
+    The chain is built like BaseHandler.load_middleware does it, but for an
+    all-async list only. So there's no adapting between sync and async, and
+    no process_view, process_template_response or process_exception hooks.
+    """
+
+    def load_middleware(self, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        handler = convert_exception_to_response(self._get_response_async)
+        for middleware_path in reversed(settings.API_MIDDLEWARE):
+            middleware = import_string(middleware_path)
+            if not getattr(middleware, "async_capable", False):
+                raise ImproperlyConfigured(
+                    f"API_MIDDLEWARE can only have async middleware: {middleware_path}"
+                )
+            mw_instance = middleware(handler)
+            if mw_instance is None:
+                raise ImproperlyConfigured(
+                    f"Middleware factory {middleware_path} returned None."
+                )
+            handler = convert_exception_to_response(mw_instance)
+        self._middleware_chain = handler
+
+
+# Sets up Django, so it has to come before ApiHandler
+django_application = get_asgi_application()
+api_application = ApiHandler()
+
+
+async def application(scope, receive, send):
+    # The admin and the frontend get the full middleware stack
+    if scope["type"] == "http" and scope["path"].startswith("/api/"):
+        await api_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import hashlib
+import json
+import os
 from pathlib import Path
 import sys
-import yaml
+import tempfile
 
 _PROJECT_DIR = Path(__file__).resolve().parent.parent
 
@@ -31,9 +34,29 @@ except FileNotFoundError:
 
 
 deploy_yaml_path = f"{_PROJECT_DIR}/assets/deploy.yaml"
+# The Docker build compiles this to JSON, so we don't have to import PyYAML.
+# The compiled copy records the hash of the YAML it came from, in case the
+# YAML changed since. See backend/amulet_model/compiled_yaml.py
+deploy_json_path = f"{_PROJECT_DIR}/assets/deploy.compiled.json"
+
+
+def _load_deploy_vars():
+    with open(deploy_yaml_path, "rb") as handle:
+        source = handle.read()
+    try:
+        with open(deploy_json_path) as handle:
+            compiled = json.load(handle)
+        if compiled["sha256"] == hashlib.sha256(source).hexdigest():
+            return compiled["data"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    import yaml
+
+    return yaml.safe_load(source)
+
+
 try:
-    with open(deploy_yaml_path) as handle:
-        deploy_vars = yaml.safe_load(handle)
+    deploy_vars = _load_deploy_vars()
     hostname = deploy_vars["hostname"]
 except (KeyError, FileNotFoundError):
     print(f"please add or populate {deploy_yaml_path}")
@@ -79,6 +102,12 @@ MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
 ]
 
+# Under ASGI, /api/ requests get their own handler with just this. See
+# core/asgi.py
+API_MIDDLEWARE = [
+    "backend.middleware.api_middleware",
+]
+
 ROOT_URLCONF = "core.urls"
 
 TEMPLATES = [
@@ -151,3 +180,91 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Solver limits
+# Cap the search frontier for a single solve so one bad opener can't push a
+# gunicorn worker (and its neighbors) out of memory. Past the cap, the solver
+# prunes harder, then falls back to a beam search, then gives up.
+
+SOLVER_MAX_FRONTIER_BYTES = 64 * 1024 * 1024
+
+# Cap the number of states each solve may expand. Unlike a wall-clock timeout,
+# this gives the same answer no matter how busy the server is. The timeout is
+# only a backstop. Expect a few thousand expansions per second.
+
+SOLVER_MAX_EXPANSIONS = 10000
+SOLVER_MAX_WAIT_SECONDS = 10
+
+# Keep only the best few states each turn. Much faster, but the answer is no
+# longer guaranteed to be optimal. Set to None for an exact search.
+
+SOLVER_BEAM_WIDTH = None
+
+# /api/play?samples=N plays the opener out over N shuffles in one request, up
+# to this many. Each shuffle gets the expansion cap above, but the timeout is
+# for all of them together.
+
+SOLVER_MAX_SAMPLES = 50
+
+# Attach solver telemetry to every /api/play response as an X-Solver-Telemetry
+# header. With DEBUG on, clients can also opt in per request by sending that
+# header.
+
+SOLVER_TELEMETRY = False
+
+# Solves run in a pool of worker processes, so the async views can keep
+# serving cheap requests in the meantime. Each gunicorn or uvicorn worker gets
+# its own pool.
+
+SOLVER_POOL_WORKERS = os.cpu_count() or 1
+
+# Admission control, per process. At most SOLVER_MAX_CONCURRENT solves run at
+# once, and up to SOLVER_MAX_QUEUE more wait in line for up to
+# SOLVER_QUEUE_TIMEOUT_SECONDS. Anything else gets a "server busy" message.
+# Solves that had to wait in a long line get a smaller budget.
+
+SOLVER_MAX_CONCURRENT = SOLVER_POOL_WORKERS
+SOLVER_MAX_QUEUE = 2 * SOLVER_MAX_CONCURRENT
+SOLVER_QUEUE_TIMEOUT_SECONDS = 2
+
+# Send solves to a standalone solver service on this Unix socket, rather than
+# the local pool (python -m backend.solver_service). If the service doesn't
+# answer within the timeout, we solve locally instead.
+
+SOLVER_SOCKET = os.environ.get("AMULET_SOLVER_SOCKET")
+SOLVER_SOCKET_TIMEOUT_SECONDS = SOLVER_MAX_WAIT_SECONDS + 5
+
+# Speculative solves. While the user looks at a new hand, solve it in the
+# background so "play it out" can answer right away (see backend/presolve.py).
+# Each play gets the next shuffle going, for the first PRESOLVE_SHUFFLES plays
+# of a hand. Set PRESOLVE_WORKERS to 0 to turn this off.
+
+PRESOLVE_WORKERS = 1
+PRESOLVE_MAX_PENDING = 2 * PRESOLVE_WORKERS
+PRESOLVE_MAX_ENTRIES = 256
+PRESOLVE_TTL_SECONDS = 120
+PRESOLVE_SHUFFLES = 2
+
+# Batch evaluation (POST /api/evaluate, see backend/batch.py). Openers are
+# played out in parallel in their own pool of low-priority processes, one
+# batch at a time per process. Requests are capped by size, openers, samples
+# per opener, and samples in total, and each batch gets EVALUATE_MAX_SECONDS.
+
+EVALUATE_WORKERS = max(1, SOLVER_POOL_WORKERS // 2)
+EVALUATE_MAX_BYTES = 64 * 1024
+EVALUATE_MAX_OPENERS = 100
+EVALUATE_MAX_SAMPLES = SOLVER_MAX_SAMPLES
+EVALUATE_MAX_TOTAL_SAMPLES = 1000
+EVALUATE_MAX_SECONDS = 30
+
+
+# Metrics
+# Each gunicorn worker writes its metrics to its own file in this directory,
+# at most once per METRICS_FLUSH_SECONDS. /api/metrics adds them all up. Every
+# worker on the box needs to share the same directory.
+
+METRICS_DIR = os.environ.get(
+    "AMULET_METRICS_DIR", f"{tempfile.gettempdir()}/amulet-metrics"
+)
+METRICS_FLUSH_SECONDS = 5
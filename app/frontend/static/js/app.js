@@ -11,6 +11,60 @@ htmx.on('htmx:afterRequest', function(evt) {
     document.getElementById("play-button").removeAttribute("disabled");
 });
 
+/* Stream the play-by-play if the browser can. Each turn's progress shows up
+as the search finishes it, then the summary and new stats replace it. */
+
+htmx.on('htmx:beforeRequest', function(evt) {
+    if (evt.detail.elt.id != "play-button" || !window.EventSource) {
+        return;
+    }
+    evt.preventDefault();
+    document.getElementById("opener-button").setAttribute("disabled", "");
+    document.getElementById("play-button").setAttribute("disabled", "");
+    var params = new URLSearchParams(evt.detail.requestConfig.parameters);
+    var source = new EventSource("/api/play/stream?" + params);
+    var finish = function() {
+        source.close();
+        document.getElementById("opener-button").removeAttribute("disabled");
+        document.getElementById("play-button").removeAttribute("disabled");
+    };
+    source.addEventListener("start", function(msg) {
+        swap_by_id(msg.data);
+    });
+    source.addEventListener("turn", function(msg) {
+        document.getElementById("summary").insertAdjacentHTML("beforeend", msg.data);
+    });
+    source.addEventListener("done", function(msg) {
+        swap_by_id(msg.data);
+        finish();
+    });
+    /* EventSource doesn't say what went wrong (a bad payload, a busy server,
+    a dropped connection), and left alone it reconnects and starts the solve
+    over. So stop, and don't leave "searching" up forever */
+    source.onerror = function() {
+        swap_by_id(
+            "<div class='summary-wrap' id='summary'><p><span class='summary-alert'>"
+            + "SOMETHING WENT WRONG: TRY AGAIN IN A MOMENT</span></p></div>"
+        );
+        finish();
+    };
+});
+
+/* Like an out-of-band swap: each piece replaces the element with its id */
+
+function swap_by_id(html) {
+    var fragment = document.createElement("div");
+    fragment.innerHTML = html;
+    Array.from(fragment.children).forEach(function(elt) {
+        elt.removeAttribute("hx-swap-oob");
+        var old = document.getElementById(elt.id);
+        if (old) {
+            old.replaceWith(elt);
+            htmx.process(elt);
+        }
+    });
+}
+
 /* Display card image when a card name is clicked. Next click hides it. */
 
 function show_autocard(card_image_url) {
@@ -0,0 +1,28 @@
+"""
+Gunicorn settings. Gunicorn picks this file up on its own when it's run from
+app/, like in the Docker container.
+
+The app is loaded and warmed up once in the master, and then the workers are
+forked from it (see backend/warmup.py). Workers skip the slow first
+requests, and they share the master's memory rather than each loading its
+own copy. Set WEB_CONCURRENCY to run more than one worker.
+"""
+
+import gc
+
+
+bind = "0.0.0.0:8000"
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+
+def when_ready(server):
+    # With preload_app, Django is set up by now
+    from backend.warmup import warm_up
+
+    warm_up()
+    # Take everything we have so far out of the garbage collector's hands.
+    # Otherwise each collection in a worker touches all these objects, and
+    # the pages they're on stop being shared
+    gc.collect()
+    gc.freeze()